@@ -0,0 +1,337 @@
+"""Benchmarks for scanning and tag writing on a synthetic library.
+
+    python benchmark.py --files 2000
+    python benchmark.py --files 5000 --dir /mnt/nas/bench --json bench_output.txt
+
+Generates small but valid M4B/M4A files (real ilst tags, sidecars, multi-part
+books, cover art, varying padding) and times each phase. Runs offline and
+without Qt.
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mp4meta import read_metadata
+from scanner import LibraryScanner
+from tagger import TagEditor, TagJob
+
+
+# ----- synthetic library -----
+
+def _atom(name: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), name) + payload
+
+
+def _full(name: bytes, payload: bytes, flags=0) -> bytes:
+    return _atom(name, struct.pack(">I", flags) + payload)
+
+
+def _text_item(key: str, value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _atom(key.encode("latin-1"), _atom(b"data", struct.pack(">II", 1, 0) + data))
+
+
+def _freeform_item(name: str, value: str) -> bytes:
+    mean = _full(b"mean", b"com.apple.iTunes")
+    name_atom = _full(b"name", name.encode("utf-8"))
+    data = _atom(b"data", struct.pack(">II", 1, 0) + value.encode("utf-8"))
+    return _atom(b"----", mean + name_atom + data)
+
+
+def _audio_track(mdat_offset: int, mdat_size: int, duration: int) -> bytes:
+    matrix = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    tkhd = _full(b"tkhd", struct.pack(">5I", 0, 0, 1, 0, duration * 1000) + b"\0" * 8 +
+                 struct.pack(">4H", 0, 0, 0x100, 0) + matrix + struct.pack(">II", 0, 0), 7)
+    mdhd = _full(b"mdhd", struct.pack(">4I", 0, 0, 44100, 44100 * duration) + struct.pack(">HH", 0x55c4, 0))
+    hdlr = _full(b"hdlr", struct.pack(">I4s", 0, b"soun") + b"\0" * 13)
+    smhd = _full(b"smhd", struct.pack(">HH", 0, 0))
+    dinf = _atom(b"dinf", _full(b"dref", struct.pack(">I", 1) + _full(b"url ", b"", 1)))
+
+    # AAC LC, 44.1 kHz stereo decoder config
+    def desc(tag, body):
+        return bytes([tag, len(body)]) + body
+    dcd = desc(0x04, bytes([0x40, 0x15]) + b"\0\0\0" + struct.pack(">II", 64000, 64000) + desc(0x05, b"\x12\x10"))
+    esds = _full(b"esds", desc(0x03, struct.pack(">HB", 1, 0) + dcd + desc(0x06, b"\x02")))
+    mp4a = _atom(b"mp4a", b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 8 +
+                 struct.pack(">HHHHI", 2, 16, 0, 0, 44100 << 16) + esds)
+
+    stbl = _atom(b"stbl",
+                 _full(b"stsd", struct.pack(">I", 1) + mp4a) +
+                 _full(b"stts", struct.pack(">III", 1, 1, 44100 * duration)) +
+                 _full(b"stsc", struct.pack(">IIII", 1, 1, 1, 1)) +
+                 _full(b"stsz", struct.pack(">II", mdat_size, 1)) +
+                 _full(b"stco", struct.pack(">II", 1, mdat_offset)))
+    mdia = _atom(b"mdia", mdhd + hdlr + _atom(b"minf", smhd + dinf + stbl))
+    return _atom(b"trak", tkhd + mdia)
+
+
+def write_mp4(path, tags, cover=None, padding=0, mdat_size=16384, duration=3600, moov_at_end=False):
+    """Write a small MP4 with an audio track, an ilst and optional cover/padding."""
+    items = b""
+    for key, value in tags.items():
+        if key.startswith("----:"):
+            items += _freeform_item(key.split(":", 2)[2], value)
+        elif key == "disk":
+            items += _atom(b"disk", _atom(b"data", struct.pack(">II", 0, 0) + struct.pack(">HHH", 0, value, 0)))
+        else:
+            items += _text_item(key, value)
+    if cover:
+        items += _atom(b"covr", _atom(b"data", struct.pack(">II", 13, 0) + cover))
+
+    meta_hdlr = _full(b"hdlr", struct.pack(">I4s", 0, b"mdir") + b"appl" + b"\0" * 9)
+    free = _atom(b"free", b"\0" * padding) if padding else b""
+    udta = _atom(b"udta", _full(b"meta", meta_hdlr + _atom(b"ilst", items) + free))
+
+    ftyp = _atom(b"ftyp", b"M4B " + struct.pack(">I", 0) + b"M4B isommp42")
+    mvhd = _full(b"mvhd", struct.pack(">4I", 0, 0, 1000, duration * 1000) + struct.pack(">IH", 0x10000, 0x100) +
+                 b"\0" * 10 + struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000) +
+                 b"\0" * 24 + struct.pack(">I", 2))
+
+    def moov(mdat_offset):
+        return _atom(b"moov", mvhd + _audio_track(mdat_offset, mdat_size, duration) + udta)
+
+    # moov size does not depend on the stco value, so one dry render gives the layout
+    moov_size = len(moov(0))
+    mdat_header = 8
+    with open(path, "wb") as f:
+        if moov_at_end:
+            f.write(ftyp)
+            f.write(struct.pack(">I4s", mdat_header + mdat_size, b"mdat") + os.urandom(mdat_size))
+            f.write(moov(len(ftyp) + mdat_header))
+        else:
+            f.write(ftyp)
+            f.write(moov(len(ftyp) + moov_size + mdat_header))
+            f.write(struct.pack(">I4s", mdat_header + mdat_size, b"mdat") + os.urandom(mdat_size))
+
+
+def generate_library(root, files=2000, seed=1):
+    """Create roughly `files` audio files under root. Returns the number written."""
+    rng = random.Random(seed)
+    authors = [f"Author {i:04d}" for i in range(max(1, files // 25))]
+    narrators = [f"Narrator {i:03d}" for i in range(max(1, files // 50))]
+    cover = b"\xff\xd8\xff\xe0" + os.urandom(60 * 1024)
+
+    written = 0
+    book = 0
+    while written < files:
+        book += 1
+        author = rng.choice(authors)
+        series = f"{author.split()[1]} Saga {rng.randint(1, 4)}" if rng.random() < 0.7 else None
+        index = rng.randint(1, 12)
+        title = f"Book {book} of the {rng.choice(['Long', 'Dark', 'Bright', 'Last'])} {rng.choice(['Road', 'Night', 'Star'])}"
+        directory = os.path.join(root, author, series or "Standalone", f"{index:02d} - {title}")
+        os.makedirs(directory, exist_ok=True)
+
+        tags = {
+            "\xa9nam": title,
+            "\xa9ART": author,
+            "\xa9day": str(rng.randint(1950, 2025)),
+            "----:com.apple.iTunes:Narrators": rng.choice(narrators),
+            "----:com.apple.iTunes:ISBN": f"978{rng.randint(0, 10**10 - 1):010d}",
+        }
+        if series:
+            tags["\xa9grp"] = f"{series} #{index}"
+            tags["disk"] = index
+        if rng.random() < 0.3:
+            tags["\xa9cmt"] = "Lorem ipsum dolor sit amet. " * rng.randint(5, 80)
+
+        if rng.random() < 0.3:
+            sidecar = {
+                "title": title,
+                "authors": [author],
+                "series": [f"{series} #{index}"] if series else [],
+                "narrators": [tags["----:com.apple.iTunes:Narrators"]],
+                "published_year": tags["\xa9day"],
+                "isbn": tags["----:com.apple.iTunes:ISBN"],
+                "asin": f"B0{rng.randint(0, 10**8 - 1):08d}",
+                "description": "A synthetic audiobook.",
+            }
+            with open(os.path.join(directory, "metadata.json"), "w", encoding="utf-8") as f:
+                json.dump(sidecar, f)
+
+        options = dict(
+            cover=cover if rng.random() < 0.5 else None,
+            padding=rng.choice([0, 0, 1024, 4096, 65536]),
+            moov_at_end=rng.random() < 0.2,
+        )
+        if rng.random() < 0.1:
+            # Multi-part m4a book
+            parts = min(rng.randint(5, 20), files - written)
+            for part in range(parts):
+                write_mp4(os.path.join(directory, f"{title} - Part {part + 1:02d}.m4a"), tags, **options)
+            written += parts
+        else:
+            write_mp4(os.path.join(directory, f"{title}.m4b"), tags, **options)
+            written += 1
+    return written
+
+
+# ----- measurement -----
+
+def _io_counters():
+    """(bytes read, bytes written) by this process, where the OS exposes them."""
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class Phase:
+    def __init__(self, name, results):
+        self.name = name
+        self.results = results
+        self.files = 0
+
+    def __enter__(self):
+        self.io = _io_counters()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        io = _io_counters()
+        result = {"phase": self.name, "seconds": round(seconds, 4), "files": self.files,
+                  "files_per_sec": round(self.files / seconds, 1) if seconds else None}
+        if self.io and io:
+            result["bytes_read"] = io[0] - self.io[0]
+            result["bytes_written"] = io[1] - self.io[1]
+        self.results.append(result)
+
+
+def measure_memory(books) -> dict:
+    """Bytes each book costs in memory and in a pickle sent to/from a scan process."""
+    data = pickle.dumps(books, protocol=pickle.HIGHEST_PROTOCOL)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = pickle.loads(data)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    count = max(1, len(copies))
+    return {"books": len(copies), "bytes_per_book": round(used / count),
+            "pickled_bytes_per_book": round(len(data) / count)}
+
+
+def run_benchmarks(root, workers=1, writers=2):
+    results = []
+
+    with Phase("discovery", results) as phase:
+        directories = list(LibraryScanner.iter_directories(root))
+        phase.files = sum(len(names) for _, names, _ in directories)
+
+    with Phase("parse (header-only)", results) as phase:
+        books = []
+        for directory, names, sidecars in directories:
+            books.extend(b for b in LibraryScanner.parse_directory(directory, names, sidecars) if b)
+        phase.files = len(books)
+    results.append({"phase": "memory", **measure_memory(books)})
+
+    with Phase("ilst read only", results) as phase:
+        for book in books:
+            read_metadata(book.path)
+        phase.files = len(books)
+
+    index_path = os.path.join(tempfile.mkdtemp(prefix="abs-bench-index-"), "scan_index.sqlite")
+    for name in ("scan (cold index)", "scan (warm index)"):
+        with Phase(name, results) as phase:
+            stats = {}
+            for found in LibraryScanner.scan(root, index_path, workers, stats):
+                pass
+            phase.files = stats["total"]
+    shutil.rmtree(os.path.dirname(index_path), ignore_errors=True)
+
+    with Phase("grouping", results) as phase:
+        library = {}
+        for book in books:
+            LibraryScanner.add_to_library(library, book)
+        phase.files = len(books)
+
+    payload = [(b, b.series or "Standalone Books", b.series_index) for b in books]
+    with Phase("diff (plan)", results) as phase:
+        plans = [TagEditor.plan(*entry) for entry in payload]
+        phase.files = len(plans)
+
+    with Phase("tag write (sync)", results) as phase:
+        job = TagJob(payload, writers=writers)
+        job.run()
+        phase.files = job.counts["changed"]
+
+    with Phase("tag write (already synced)", results) as phase:
+        job = TagJob(payload, writers=writers)
+        job.run()
+        phase.files = len(payload)
+
+    # Longer descriptions: some fit the padding, some force a rewrite
+    rng = random.Random(2)
+    for book in books:
+        book.description = "Updated description. " * rng.choice([1, 20, 200])
+    with Phase("tag write (grown tags)", results) as phase:
+        job = TagJob(payload, writers=writers)
+        job.run()
+        phase.files = job.counts["changed"]
+
+    return results
+
+
+def print_results(results, out=sys.stdout):
+    out.write(f"{'phase':<28}{'seconds':>10}{'files':>8}{'files/s':>11}{'MB read':>10}{'MB written':>12}\n")
+    for r in results:
+        if r["phase"] == "memory":
+            continue
+        read = f"{r['bytes_read'] / 1e6:.2f}" if "bytes_read" in r else "-"
+        written = f"{r['bytes_written'] / 1e6:.2f}" if "bytes_written" in r else "-"
+        out.write(f"{r['phase']:<28}{r['seconds']:>10.3f}{r['files']:>8}"
+                  f"{r['files_per_sec'] or 0:>11.1f}{read:>10}{written:>12}\n")
+    for r in results:
+        if r["phase"] == "memory":
+            out.write(f"\nMemory: {r['bytes_per_book']} bytes per book in memory, "
+                      f"{r['pickled_bytes_per_book']} bytes pickled ({r['books']} books)\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scanning and tag writing on a synthetic library")
+    parser.add_argument("--files", type=int, default=2000, help="audio files to generate (default: 2000)")
+    parser.add_argument("--dir", help="generate the library in a new folder under DIR instead of the temp dir "
+                                      "(e.g. on a NAS mount)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated library (the tag phases have modified it)")
+    parser.add_argument("--workers", type=int, default=1, help="scan processes (default: 1)")
+    parser.add_argument("--writers", type=int, default=2, help="tag writer threads (default: 2)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+    # Always a folder of its own, so cleaning up never touches anything else in --dir
+    root = tempfile.mkdtemp(prefix="abs-bench-", dir=args.dir)
+    try:
+        start = time.perf_counter()
+        written = generate_library(root, args.files, args.seed)
+        print(f"Generated {written} files in {root} ({time.perf_counter() - start:.1f}s)")
+
+        results = run_benchmarks(root, args.workers, args.writers)
+        print_results(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"files": written, "workers": args.workers, "writers": args.writers,
+                           "results": results}, f, indent=2)
+    finally:
+        if args.keep:
+            print(f"Kept the generated library in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
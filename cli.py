@@ -0,0 +1,328 @@
+"""Headless entry point: scan a library or sync its tags without Qt.
+
+    python cli.py scan /path/to/library > books.ndjson
+    python cli.py sync /path/to/library --author "Brandon Sanderson" --dry-run
+    python cli.py duplicates /path/to/library
+    python cli.py sidecars /path/to/library --series "Mistborn"
+    python cli.py rollback 12
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+from metrics import JobMetrics
+from scanner import LibraryScanner
+
+
+def config_path(name) -> str:
+    # Same folder the GUI keeps its files in through QSettings on Linux
+    config_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_dir, "AudiobookManager", name)
+
+
+def default_index_path() -> str:
+    return config_path("scan_index.sqlite")
+
+
+def default_journal_path() -> str:
+    return config_path("tag_journal.sqlite")
+
+
+def book_record(book) -> dict:
+    record = {name: getattr(book, name) for name in book.FIELDS}
+    record["filename"] = book.filename
+    return record
+
+
+def iter_books(args):
+    index_path = None if args.no_index else (args.index or default_index_path())
+    stats = {}
+    metrics = JobMetrics("scan")
+    for books in LibraryScanner.scan(args.root, index_path, args.workers, stats, metrics,
+                                     tuple(args.series_pattern or ()), args.remote):
+        yield from books
+    metrics.finish()
+    metrics.append_to_log(args.timings)
+    print(f"Scanned {stats['total']} files, {stats['reused']} unchanged.", file=sys.stderr)
+    if args.verbose:
+        print(metrics.report(), file=sys.stderr)
+
+
+def cmd_scan(args):
+    out = sys.stdout
+    for book in iter_books(args):
+        out.write(json.dumps(book_record(book), ensure_ascii=False) + "\n")
+    return 0
+
+
+def filtered_books(args):
+    """Scanned books matching --author and --series."""
+    author = args.author.casefold() if args.author else None
+    series = args.series.casefold() if args.series else None
+    for book in iter_books(args):
+        series_name = book.series if book.series else "Standalone Books"
+        if author and book.author.casefold() != author:
+            continue
+        if series and series_name.casefold() != series:
+            continue
+        yield book
+
+
+def cmd_sync(args):
+    from tagger import TagEditor, TagJob
+
+    payload = [(book, book.series if book.series else "Standalone Books", book.series_index)
+               for book in filtered_books(args)]
+
+    if not payload:
+        print("No books match the filter.", file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        changed = rewrites = 0
+        for book, series_name, index in payload:
+            try:
+                plan = TagEditor.plan(book, series_name, index)
+            except Exception as e:
+                print(f"Failed to read {book.filename}: {e}", file=sys.stderr)
+                continue
+            if plan.changes:
+                changed += 1
+                rewrites += plan.rewrite
+                print(json.dumps({
+                    "path": book.path,
+                    "changes": sorted(plan.changes),
+                    "rewrite": plan.rewrite,
+                    "rewrite_bytes": plan.rewrite_bytes,
+                }, ensure_ascii=False))
+        print(f"Dry run: {changed} of {len(payload)} files would change, "
+              f"{rewrites} would need a full rewrite.", file=sys.stderr)
+        return 0
+
+    from journal import TagJournal
+
+    journal = None if args.no_journal else TagJournal(args.journal or default_journal_path())
+    try:
+        return run_tag_job(args, TagJob(payload, journal=journal))
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def cmd_resume(args):
+    from journal import TagJournal
+    from tagger import TagJob
+
+    journal = TagJournal(args.journal or default_journal_path())
+    try:
+        payload, done = journal.resume(args.job)
+        if not payload:
+            print(f"Job {args.job} has no stored payload.", file=sys.stderr)
+            return 1
+        print(f"Resuming job {args.job}: {len({b.path for b, _, _ in payload} - done)} files left.", file=sys.stderr)
+        return run_tag_job(args, TagJob(payload, journal=journal, journal_id=args.job, done=done))
+    finally:
+        journal.close()
+
+
+def run_tag_job(args, job):
+    job.rewrite_budget = None if args.rewrite_budget < 0 else args.rewrite_budget * 1024 * 1024
+    job.writers = max(1, args.writers)
+    job.retries = max(0, args.retries)
+    job.on_item = lambda book, status: print(f"{status}\t{book.path}")
+    try:
+        deferred = job.run()
+    except KeyboardInterrupt:
+        job.cancel()
+        raise
+    if job.journal_id is not None:
+        print(f"Journaled as job {job.journal_id} (undo with: cli.py rollback {job.journal_id}, "
+              f"continue with: cli.py resume {job.journal_id})", file=sys.stderr)
+    job.metrics.append_to_log(args.timings)
+    if args.verbose:
+        print(job.metrics.report(), file=sys.stderr)
+
+    counts = job.counts
+    print(f"{counts['changed']} updated, {counts['skipped']} already up to date, "
+          f"{counts['failed']} failed, {len(deferred)} deferred.", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+def cmd_duplicates(args):
+    from duplicates import find_duplicates
+    from index import ScanIndex
+
+    books = list(iter_books(args))
+    audio_info = {}
+    if not args.no_index:
+        # The scan above filled in sizes and durations, so only collisions are read
+        index = ScanIndex(args.index or default_index_path())
+        try:
+            audio_info = index.audio_info(args.root)
+        finally:
+            index.close()
+
+    groups = find_duplicates(books, audio_info, audio=not args.no_audio)
+    for group in groups:
+        print(json.dumps({
+            "match": group.kinds,
+            "key": group.key,
+            "paths": [book.path for book in group.books],
+        }, ensure_ascii=False))
+    print(f"{len(groups)} groups of possible duplicates.", file=sys.stderr)
+    return 0
+
+
+def cmd_sidecars(args):
+    from sidecars import export_sidecars
+
+    books = list(filtered_books(args))
+    if not books:
+        print("No books match the filter.", file=sys.stderr)
+        return 1
+
+    def on_item(directory, status):
+        if status != "unchanged" or args.verbose:
+            print(f"{status}\t{directory}")
+
+    counts = export_sidecars(books, args.threads, args.dry_run, on_item)
+    prefix = "Dry run: would have " if args.dry_run else ""
+    print(f"{prefix}{counts['created']} created, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+          f"{counts['conflict']} folders holding different books skipped, {counts['failed']} failed.",
+          file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+def cmd_journal(args):
+    from journal import TagJournal
+
+    journal = TagJournal(args.journal or default_journal_path())
+    try:
+        for job in journal.jobs():
+            print(json.dumps(job, ensure_ascii=False))
+    finally:
+        journal.close()
+    return 0
+
+
+def cmd_rollback(args):
+    from journal import TagJournal
+
+    journal = TagJournal(args.journal or default_journal_path())
+    try:
+        paths = [os.path.abspath(p) for p in args.path] if args.path else None
+        counts = journal.rollback(args.job, paths, args.force,
+                                  lambda path, status: print(f"{status}\t{path}"))
+    finally:
+        journal.close()
+    print(f"{counts['restored']} restored, {counts['conflict']} changed since (use --force), "
+          f"{counts['missing']} missing, {counts['failed']} failed.", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+def library_dir(path: str) -> str:
+    if not os.path.isdir(path):
+        raise argparse.ArgumentTypeError(f"not a directory: {path}")
+    return path
+
+
+def series_pattern(pattern: str) -> str:
+    from series import SeriesParser
+
+    try:
+        SeriesParser([pattern])
+    except (re.error, ValueError) as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return pattern
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audiobook Metadata Manager (headless)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_scan_args(p):
+        p.add_argument("root", type=library_dir, help="library folder")
+        p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="processes used to parse changed files (default: CPU count)")
+        p.add_argument("--index", help=f"scan index file (default: {default_index_path()})")
+        p.add_argument("--no-index", action="store_true", help="parse every file, ignore the scan index")
+        p.add_argument("--series-pattern", action="append", type=series_pattern, metavar="REGEX",
+                       help="extra series format, tried before the built-in ones; needs (?P<name>...) "
+                            "and (?P<index>...) groups (repeatable)")
+        p.add_argument("--remote", action="store_true",
+                       help="library is on a network mount: list and read many files at once, "
+                            "in large blocks (--workers is ignored)")
+        add_report_args(p)
+
+    def add_report_args(p):
+        p.add_argument("--timings", metavar="FILE", help="append per-phase timings of each job to FILE (JSON lines)")
+        p.add_argument("-v", "--verbose", action="store_true", help="print a timing report to stderr")
+
+    def add_filter_args(p):
+        p.add_argument("--author", help="only books by this author (case-insensitive)")
+        p.add_argument("--series", help="only books in this series (case-insensitive)")
+        p.add_argument("--dry-run", action="store_true", help="report what would change, write nothing")
+
+    def add_job_args(p):
+        p.add_argument("--writers", type=int, default=2, help="files written concurrently (default: 2)")
+        p.add_argument("--rewrite-budget", type=int, default=-1, metavar="MB",
+                       help="defer full-file rewrites beyond this many MB (default: unlimited)")
+        p.add_argument("--retries", type=int, default=3,
+                       help="retries of a file after an I/O error, with growing delays (default: 3)")
+        p.add_argument("--journal", help=f"undo journal file (default: {default_journal_path()})")
+
+    p_scan = sub.add_parser("scan", help="print every book as one JSON object per line")
+    add_scan_args(p_scan)
+    p_scan.set_defaults(func=cmd_scan)
+
+    p_sync = sub.add_parser("sync", help="write the scanned metadata into the files' tags")
+    add_scan_args(p_sync)
+    add_filter_args(p_sync)
+    add_job_args(p_sync)
+    p_sync.add_argument("--no-journal", action="store_true",
+                        help="do not record the replaced tags (no undo, no resume)")
+    p_sync.set_defaults(func=cmd_sync)
+
+    p_sidecars = sub.add_parser("sidecars", help="write Audiobookshelf metadata.json files from the scanned metadata")
+    add_scan_args(p_sidecars)
+    add_filter_args(p_sidecars)
+    p_sidecars.add_argument("--threads", type=int, default=8, help="folders written concurrently (default: 8)")
+    p_sidecars.set_defaults(func=cmd_sidecars)
+
+    p_resume = sub.add_parser("resume", help="continue an interrupted sync, retrying files that failed")
+    p_resume.add_argument("job", type=int, help="job id (see the journal command)")
+    add_job_args(p_resume)
+    add_report_args(p_resume)
+    p_resume.set_defaults(func=cmd_resume)
+
+    p_dup = sub.add_parser("duplicates", help="print groups of likely duplicate books as JSON lines")
+    add_scan_args(p_dup)
+    p_dup.add_argument("--no-audio", action="store_true",
+                       help="only compare ISBN/ASIN and author + title, not the audio")
+    p_dup.set_defaults(func=cmd_duplicates)
+
+    p_journal = sub.add_parser("journal", help="list journaled tag jobs as JSON lines, newest first")
+    p_journal.add_argument("--journal", help=f"undo journal file (default: {default_journal_path()})")
+    p_journal.set_defaults(func=cmd_journal)
+
+    p_rollback = sub.add_parser("rollback", help="restore the tags a journaled tag job replaced")
+    p_rollback.add_argument("job", type=int, help="job id (see the journal command)")
+    p_rollback.add_argument("--path", action="append", help="only this file (repeatable)")
+    p_rollback.add_argument("--force", action="store_true", help="also restore files whose tags changed since")
+    p_rollback.add_argument("--journal", help=f"undo journal file (default: {default_journal_path()})")
+    p_rollback.set_defaults(func=cmd_rollback)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # The reader went away (cli.py scan LIB | head); point stdout at devnull
+        # so the interpreter's final flush does not raise again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""On-disk cache of cover thumbnails, keyed by file path + mtime + size."""
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage
+
+from details import file_stamp
+from mp4meta import read_cover
+
+
+class CoverCache:
+    """Cover thumbnails, extracted once per version of a file.
+
+    The embedded image (often several MB) is only read when a thumbnail is
+    missing; files without a cover get an empty marker so they are not read
+    again either. Entries are written to a temp file and renamed, so the
+    cache can be used from several threads.
+    """
+
+    SIZE = 256
+
+    def __init__(self, directory, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def entry(self, path, stamp) -> str:
+        key = hashlib.blake2b(f"{os.fspath(path)}\0{stamp[0]}\0{stamp[1]}".encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, path) -> Optional[QImage]:
+        """Thumbnail of path's cover, None without cover (or when unreadable)."""
+        stamp = file_stamp(path)
+        if stamp is None:
+            return None
+        entry = self.entry(path, stamp)
+        if os.path.exists(entry + ".thumb"):
+            image = QImage(entry + ".thumb")
+            if not image.isNull():
+                return image
+        elif os.path.exists(entry + ".none"):
+            return None
+
+        try:
+            cover = read_cover(path)
+        except Exception as e:
+            # Not cached: the share may just be gone for a moment
+            print(f"Failed to read cover of {os.path.basename(path)}: {e}")
+            return None
+        image = QImage.fromData(cover) if cover else None
+        if image is not None and not image.isNull():
+            image = image.scaled(self.SIZE, self.SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        else:
+            image = None
+        self.store(entry, image)
+        return image
+
+    def store(self, entry: str, image: Optional[QImage]):
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+            os.close(fd)
+            # PNG keeps transparency; QImage finds the format from the content when loading
+            if image is None or image.save(tmp, "PNG" if image.hasAlphaChannel() else "JPEG", 85):
+                os.replace(tmp, entry + (".thumb" if image is not None else ".none"))
+            else:
+                os.unlink(tmp)
+        except OSError as e:
+            print(f"Failed to cache cover thumbnail: {e}")
+
+    def prune(self):
+        """Drop the oldest thumbnails once the cache is over max_bytes."""
+        files = []
+        total = 0
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes * 0.8:
+                break
@@ -0,0 +1,81 @@
+"""Full tag sets and cover thumbnails of single books, for the detail panels."""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class BookDetails:
+    path: str
+    # (st_mtime_ns, st_size) of the file when it was read
+    stamp: Tuple[int, int]
+    tags: Dict[str, list]
+    # Scaled cover image (a QImage in the GUI), None without cover
+    thumbnail: object = None
+    # Approximate memory held, in bytes
+    cost: int = 0
+    error: Optional[str] = None
+
+
+def file_stamp(path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def tags_cost(tags: Dict[str, list]) -> int:
+    """Rough size of a tag dict; text dominates, so count characters."""
+    return 200 + sum(100 + len(key) + sum(len(str(v)) for v in values) for key, values in tags.items())
+
+
+class DetailCache:
+    """LRU of BookDetails by path, bounded by their approximate size.
+
+    Shared by the GUI and the loader thread. get() returns whatever is
+    cached so a panel can show it at once; fresh() tells whether it still
+    matches the file.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items: "OrderedDict[str, BookDetails]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path) -> Optional[BookDetails]:
+        with self.lock:
+            details = self.items.get(path)
+            if details is not None:
+                self.items.move_to_end(path)
+            return details
+
+    def fresh(self, path, stamp) -> bool:
+        with self.lock:
+            details = self.items.get(path)
+            return details is not None and details.stamp == stamp
+
+    def put(self, details: BookDetails):
+        with self.lock:
+            old = self.items.pop(details.path, None)
+            if old is not None:
+                self.size -= old.cost
+            self.items[details.path] = details
+            self.size += details.cost
+            while self.size > self.max_bytes and len(self.items) > 1:
+                _, dropped = self.items.popitem(last=False)
+                self.size -= dropped.cost
+
+    def discard(self, path):
+        with self.lock:
+            details = self.items.pop(path, None)
+            if details is not None:
+                self.size -= details.cost
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
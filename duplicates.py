@@ -0,0 +1,139 @@
+"""Duplicate detection over scan results.
+
+Books are compared by exact ISBN/ASIN, by normalized author + title + series
+index, and by a sampled fingerprint of the audio payload. Metadata matches
+only count across folders, since the parts of a multi-file book share them.
+"""
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import Audiobook
+from mp4meta import read_metadata
+from search import normalize_id
+
+
+# The fingerprint hashes this many evenly spaced chunks of each mdat atom
+SAMPLES = 4
+SAMPLE_SIZE = 64 * 1024
+
+KIND_LABELS = {"isbn": "ISBN", "asin": "ASIN", "title": "Author + title", "audio": "Audio"}
+
+
+@dataclass
+class DuplicateGroup:
+    kinds: List[str]
+    key: str
+    books: List[Audiobook]
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return " ".join(re.findall(r"\w+", text.casefold())) if text else ""
+
+
+def title_key(book: Audiobook) -> Optional[Tuple[str, str, str]]:
+    title = normalize_text(book.title)
+    if not title:
+        return None
+    index = book.series_index or ""
+    try:
+        index = f"{float(index):g}"
+    except ValueError:
+        pass
+    return normalize_text(book.author), title, index
+
+
+def fingerprint(path) -> Optional[str]:
+    """Hash of the audio payload size, duration and a few sampled chunks of it."""
+    meta = read_metadata(path)
+    if meta is None or not meta.mdat:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{sum(size for _, size in meta.mdat)}:{meta.duration or 0:.3f}".encode())
+    try:
+        with open(path, "rb") as f:
+            for offset, size in meta.mdat:
+                # Skip the atom header (8 or 16 bytes), so differing tags do not matter
+                start, end = offset + 16, offset + size
+                span = max(0, end - start - SAMPLE_SIZE)
+                for i in range(SAMPLES):
+                    f.seek(start + span * i // max(1, SAMPLES - 1))
+                    digest.update(f.read(min(SAMPLE_SIZE, end - start)))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _metadata_groups(books, key_fn) -> Dict[object, Dict[str, List[Audiobook]]]:
+    buckets = {}
+    for book in books:
+        key = key_fn(book)
+        if key:
+            buckets.setdefault(key, {}).setdefault(os.path.dirname(book.path), []).append(book)
+    return {key: folders for key, folders in buckets.items() if len(folders) > 1}
+
+
+def _audio_groups(books, audio_info, on_progress) -> Dict[str, List[Audiobook]]:
+    # 1. Candidates share payload size and duration; both come from the scan
+    #    index, so unchanged files are not opened at all
+    candidates = {}
+    for book in books:
+        info = audio_info.get(book.path)
+        if not info or info[0] is None:
+            meta = read_metadata(book.path)
+            info = (sum(size for _, size in meta.mdat), meta.duration) if meta else None
+        if info and info[0]:
+            candidates.setdefault((info[0], round(info[1] or 0, 1)), []).append(book)
+    candidates = [group for group in candidates.values() if len(group) > 1]
+
+    # 2. Only those are fingerprinted, reading SAMPLES * SAMPLE_SIZE bytes each
+    total = sum(len(group) for group in candidates)
+    done = 0
+    groups = {}
+    for group in candidates:
+        by_hash = {}
+        for book in group:
+            digest = fingerprint(book.path)
+            if digest:
+                by_hash.setdefault(digest, []).append(book)
+            done += 1
+            on_progress(done, total)
+        for digest, same in by_hash.items():
+            if len(same) > 1:
+                groups[digest] = same
+    return groups
+
+
+def find_duplicates(books: List[Audiobook], audio_info: Optional[Dict] = None, audio: bool = True,
+                    on_progress: Callable[[int, int], None] = lambda done, total: None) -> List[DuplicateGroup]:
+    """Group likely duplicates; books matched several ways are reported once.
+
+    audio_info is ScanIndex.audio_info() output; files missing from it get a
+    header-only read. on_progress(done, total) follows the fingerprinting.
+    """
+    found = {}
+
+    def add(kind, key, group_books):
+        paths = frozenset(book.path for book in group_books)
+        group = found.get(paths)
+        if group is None:
+            found[paths] = DuplicateGroup([kind], key, sorted(group_books, key=lambda b: b.path))
+        elif kind not in group.kinds:
+            group.kinds.append(kind)
+
+    for kind, field in (("isbn", "isbn"), ("asin", "asin")):
+        groups = _metadata_groups(books, lambda book: normalize_id(getattr(book, field)))
+        for key, folders in groups.items():
+            add(kind, key, [book for folder in folders.values() for book in folder])
+
+    for key, folders in _metadata_groups(books, title_key).items():
+        label = f"{key[0]} - {key[1]}" + (f" #{key[2]}" if key[2] else "")
+        add("title", label, [book for folder in folders.values() for book in folder])
+
+    if audio:
+        for digest, same in _audio_groups(books, audio_info or {}, on_progress).items():
+            add("audio", digest[:12], same)
+
+    return sorted(found.values(), key=lambda g: (g.books[0].author, g.books[0].title))
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+from models import Audiobook, LAZY_DESCRIPTION
+
+
+class ScanIndex:
+    """On-disk cache of parsed books, keyed by path + size + mtime + sidecar mtimes."""
+
+    # 5: series strings parsed by series.SeriesParser
+    SCHEMA_VERSION = 5
+    FIELDS = ("title", "author", "series", "series_index", "source",
+              "narrators", "year", "isbn", "asin", "description")
+    # Stored rows are committed in batches of this size, so a scan that is
+    # killed part way keeps most of its work; one commit per row is far slower
+    COMMIT_EVERY = 500
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.uncommitted = 0
+
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS books")
+            self.conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+
+        columns = ", ".join(f"{name} TEXT" for name in self.FIELDS)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS books ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, sidecar TEXT, "
+            # 1 when the description is too long to keep in memory and is read from disk
+            f"{columns}, description_lazy INTEGER, "
+            # Total mdat size and duration, for duplicate detection without reopening files
+            "audio_size INTEGER, duration REAL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def sidecar_key(mtimes: Iterable[Optional[int]]) -> str:
+        """Combine the mtimes of metadata.json / abs_metadata.json into one key."""
+        return ":".join(str(m) if m is not None else "-" for m in mtimes)
+
+    def load(self, root) -> Dict[str, Tuple]:
+        """Return every cached row under root as {path: (size, mtime, sidecar, book)}."""
+        root = os.path.join(os.path.abspath(root), "")
+        upper = root[:-1] + chr(ord(root[-1]) + 1)
+        cursor = self.conn.execute(
+            f"SELECT path, size, mtime, sidecar, {', '.join(self.FIELDS)}, description_lazy "
+            "FROM books WHERE path >= ? AND path < ?",
+            (root, upper)
+        )
+
+        rows = {}
+        for row in cursor:
+            path = row[0]
+            fields = dict(zip(self.FIELDS, row[4:-1]))
+            if row[-1]:
+                fields["description"] = LAZY_DESCRIPTION
+            rows[path] = (row[1], row[2], row[3], Audiobook(path=path, **fields))
+        return rows
+
+    def store(self, book: Audiobook, size: int, mtime: int, sidecar: str,
+              audio_size: Optional[int] = None, duration: Optional[float] = None):
+        # Never load a lazy description just to cache it; the flag brings it back as lazy
+        lazy = not book.description_loaded
+        values = [None if lazy and name == "description" else getattr(book, name) for name in self.FIELDS]
+        placeholders = ", ".join("?" for _ in range(7 + len(self.FIELDS)))
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO books (path, size, mtime, sidecar, {', '.join(self.FIELDS)}, "
+            f"description_lazy, audio_size, duration) VALUES ({placeholders})",
+            [book.path, size, mtime, sidecar, *values, int(lazy), audio_size, duration]
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def audio_info(self, root) -> Dict[str, Tuple[Optional[int], Optional[float]]]:
+        """{path: (audio payload size, duration)} for every cached file under root."""
+        root = os.path.join(os.path.abspath(root), "")
+        upper = root[:-1] + chr(ord(root[-1]) + 1)
+        cursor = self.conn.execute(
+            "SELECT path, audio_size, duration FROM books WHERE path >= ? AND path < ?", (root, upper)
+        )
+        return {path: (audio_size, duration) for path, audio_size, duration in cursor}
+
+    def remove(self, paths: Iterable[str]):
+        self.conn.executemany("DELETE FROM books WHERE path = ?", ((p,) for p in paths))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from models import Audiobook, LAZY_DESCRIPTION
+
+
+class TagJournal:
+    """Write-ahead log of the tag values every tag job replaces.
+
+    Before a file is saved, the original values of the tags about to change
+    (metadata only, never audio) are committed together with the new values.
+    rollback() writes the originals back, for a whole job or some of its files.
+
+    The job's payload and a state per file are kept as well, so a job that
+    was interrupted (crash, cancel, NAS gone) can be resumed: files in DONE
+    states are skipped, the rest are planned and written again.
+    """
+
+    SCHEMA_VERSION = 2
+    # Entry states a resumed job does not touch again
+    DONE = ("written", "skipped", "rolled back")
+    # Jobs older than the newest KEEP_JOBS are dropped when a job starts
+    KEEP_JOBS = 100
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Shared by the writer threads of a job, serialized by the lock
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # A record must be on disk before the file it describes is touched
+        self.conn.execute("PRAGMA synchronous=FULL")
+
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            for table in ("payload", "entries", "jobs"):
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self.conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, started REAL, description TEXT, "
+            # "running" (also after a crash), "cancelled" or "finished"
+            "status TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "job INTEGER, path TEXT, "
+            # JSON {tag: value}; a null original means the tag did not exist
+            "original TEXT, written TEXT, "
+            # "queued", "skipped", "deferred", "pending" (save started),
+            # "written", "failed" or "rolled back"
+            "state TEXT, "
+            "PRIMARY KEY (job, path))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS payload ("
+            "job INTEGER, seq INTEGER, book TEXT, series TEXT, series_index TEXT, "
+            "PRIMARY KEY (job, seq))"
+        )
+        self.conn.commit()
+
+    def begin(self, description: str, payload) -> int:
+        """Start a job: store its payload, queue every file and return the job id."""
+        with self.lock:
+            cursor = self.conn.execute("INSERT INTO jobs (started, description, status) VALUES (?, ?, 'running')",
+                                       (time.time(), description))
+            job = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO payload (job, seq, book, series, series_index) VALUES (?, ?, ?, ?, ?)",
+                ((job, seq, json.dumps(_book_record(book)), series, index)
+                 for seq, (book, series, index) in enumerate(payload))
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO entries (job, path, state) VALUES (?, ?, 'queued')",
+                ((job, book.path) for book, _, _ in payload)
+            )
+            old = [row[0] for row in self.conn.execute(
+                "SELECT id FROM jobs ORDER BY id DESC LIMIT -1 OFFSET ?", (self.KEEP_JOBS,))]
+            if old:
+                for table, column in (("entries", "job"), ("payload", "job"), ("jobs", "id")):
+                    self.conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", ((j,) for j in old))
+            self.conn.commit()
+            return job
+
+    def resume(self, job: int) -> Tuple[list, Set[str]]:
+        """Mark a job running again; returns its payload and the paths already done."""
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET status = 'running' WHERE id = ?", (job,))
+            self.conn.commit()
+            payload = [(_book_from_record(json.loads(book)), series, index) for book, series, index in
+                       self.conn.execute("SELECT book, series, series_index FROM payload WHERE job = ? ORDER BY seq",
+                                         (job,))]
+            done = {path for path, in self.conn.execute(
+                f"SELECT path FROM entries WHERE job = ? AND state IN ({', '.join('?' * len(self.DONE))})",
+                (job, *self.DONE))}
+        return payload, done
+
+    def finish(self, job: int, status: str):
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (status, job))
+            self.conn.commit()
+
+    def record(self, job: int, path, original: Dict[str, Optional[list]], written: Dict[str, Optional[list]]):
+        """Log a file as about to be saved; call before touching it."""
+        with self.lock:
+            # A retried file keeps the original from its first attempt, which
+            # may have changed the file already
+            self.conn.execute(
+                "INSERT INTO entries (job, path, original, written, state) VALUES (?, ?, ?, ?, 'pending') "
+                "ON CONFLICT (job, path) DO UPDATE SET original = COALESCE(original, excluded.original), "
+                "written = excluded.written, state = 'pending'",
+                (job, os.fspath(path), json.dumps(original), json.dumps(written))
+            )
+            self.conn.commit()
+
+    def set_state(self, job: int, path, state: str):
+        self.set_states(job, [(path, state)])
+
+    def set_states(self, job: int, states: Iterable[Tuple[str, str]]):
+        """Update many (path, state) pairs in one commit.
+
+        A file whose save was interrupted or failed but that turns out to be
+        in sync was written after all, so "skipped" makes it "written".
+        """
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE entries SET state = CASE WHEN ? = 'skipped' AND state IN ('pending', 'failed') "
+                "AND original IS NOT NULL THEN 'written' ELSE ? END WHERE job = ? AND path = ?",
+                ((state, state, job, os.fspath(path)) for path, state in states)
+            )
+            self.conn.commit()
+
+    def jobs(self) -> List[dict]:
+        """Newest first: id, started, description, status, file counts per state and
+        whether anything is left to resume."""
+        with self.lock:
+            jobs = {row[0]: {"id": row[0], "started": row[1], "description": row[2], "status": row[3],
+                             "states": {}, "resumable": False}
+                    for row in self.conn.execute(
+                        "SELECT id, started, description, status FROM jobs ORDER BY id DESC")}
+            for job, state, count in self.conn.execute(
+                    "SELECT job, state, COUNT(*) FROM entries GROUP BY job, state"):
+                if job in jobs:
+                    jobs[job]["states"][state] = count
+            has_payload = {job for job, in self.conn.execute("SELECT DISTINCT job FROM payload")}
+        for job in jobs.values():
+            job["resumable"] = job["id"] in has_payload and any(
+                state not in self.DONE for state in job["states"])
+        return list(jobs.values())
+
+    def interrupted(self) -> List[int]:
+        """Jobs still marked running, i.e. the process died while they ran."""
+        with self.lock:
+            return [job for job, in self.conn.execute("SELECT id FROM jobs WHERE status = 'running'")]
+
+    def entries(self, job: int) -> List[dict]:
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT path, original, written, state FROM entries WHERE job = ? ORDER BY path", (job,))
+            return [{"path": path, "original": json.loads(original or "{}"), "written": json.loads(written or "{}"),
+                     "state": state} for path, original, written, state in cursor]
+
+    def rollback(self, job: int, paths: Optional[Iterable[str]] = None, force: bool = False,
+                 on_item: Callable[[str, str], None] = lambda path, status: None) -> Dict[str, int]:
+        """Restore the original tags of a job's files (all, or just paths).
+
+        A file whose tags no longer hold what the job wrote was changed
+        since, and is left alone ("conflict") unless force is set. Pending
+        entries (a save that may not have finished) are restored as well.
+        Returns counts per status; on_item(path, status) follows each file.
+        """
+        from mp4meta import read_tags
+        from tagger import TagEditor
+
+        wanted = set(paths) if paths is not None else None
+        counts = {"restored": 0, "conflict": 0, "missing": 0, "failed": 0}
+        for entry in self.entries(job):
+            path = entry["path"]
+            if wanted is not None and path not in wanted:
+                continue
+            if entry["state"] not in ("pending", "written"):
+                continue
+            if not os.path.exists(path):
+                status = "missing"
+            else:
+                try:
+                    current = _plain(read_tags(path))
+                    if not force and entry["state"] == "written" and any(
+                            current.get(key) != value for key, value in entry["written"].items()):
+                        status = "conflict"
+                    else:
+                        TagEditor.write(path, _tag_values(entry["original"]))
+                        self.set_state(job, path, "rolled back")
+                        status = "restored"
+                except Exception as e:
+                    print(f"Failed to roll back {os.path.basename(path)}: {e}")
+                    status = "failed"
+            counts[status] += 1
+            on_item(path, status)
+        return counts
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def _book_record(book: Audiobook) -> dict:
+    record = {name: getattr(book, name) for name in Audiobook.FIELDS if name != "description"}
+    # Same rule as the scan index: a lazy description stays on disk
+    if book.description_loaded:
+        record["description"] = book.description
+    else:
+        record["description_lazy"] = True
+    return record
+
+
+def _book_from_record(record: dict) -> Audiobook:
+    if record.pop("description_lazy", False):
+        record["description"] = LAZY_DESCRIPTION
+    return Audiobook(**record)
+
+
+def _plain(tags: Dict[str, Optional[list]]) -> Dict[str, Optional[list]]:
+    """Tags as they look after a JSON round trip (tuples become lists)."""
+    return json.loads(json.dumps(tags))
+
+
+def _tag_values(tags: Dict[str, Optional[list]]) -> Dict[str, Optional[list]]:
+    """Undo the JSON round trip for values mutagen needs as tuples."""
+    return {key: [tuple(v) for v in value] if key in ("disk", "trkn") and value else value
+            for key, value in tags.items()}
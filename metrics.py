@@ -0,0 +1,134 @@
+import bisect
+import heapq
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class JobMetrics:
+    """Per-phase wall time, per-file latency histogram and slowest files for one scan or tag job.
+
+    Safe to update from several threads (tag writers, pool callbacks).
+    """
+
+    # Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+    SLOWEST = 10
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started = time.time()
+        self.total = 0.0
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+        self.files = 0
+        self.file_seconds = 0.0
+        self.bytes_read = 0
+        self._slowest = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def timed_iter(self, iterable, name: str):
+        """Yield from iterable, charging the time spent producing each item to a phase."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase(name, time.perf_counter() - start)
+                return
+            self.add_phase(name, time.perf_counter() - start)
+            yield item
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def record_file(self, path, seconds: float, bytes_read: int = 0):
+        with self._lock:
+            self.files += 1
+            self.file_seconds += seconds
+            self.bytes_read += bytes_read
+            self.histogram[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            entry = (seconds, str(path))
+            if len(self._slowest) < self.SLOWEST:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def finish(self):
+        self.total = time.time() - self.started
+
+    @property
+    def slowest(self) -> List[tuple]:
+        return sorted(self._slowest, reverse=True)
+
+    def bucket_labels(self) -> List[str]:
+        labels = [f"< {b * 1000:g} ms" for b in self.BUCKETS]
+        labels.append(f">= {self.BUCKETS[-1] * 1000:g} ms")
+        return labels
+
+    def summary(self) -> str:
+        """One line for the status bar."""
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in
+                           sorted(self.phases.items(), key=lambda p: -p[1]))
+        text = f"{self.kind.capitalize()} took {self.total:.1f}s ({phases})"
+        if self.bytes_read:
+            text += f", {self.bytes_read / 1024 / 1024:.1f} MB read"
+        return text
+
+    def report(self) -> str:
+        """Multi-line text for the diagnostics dialog."""
+        lines = [f"{self.kind.capitalize()} started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}",
+                 f"Wall time: {self.total:.3f}s", "", "Phases (summed across threads/processes):"]
+        for name, seconds in sorted(self.phases.items(), key=lambda p: -p[1]):
+            lines.append(f"  {name:<16}{seconds:>10.3f}s")
+        if self.counts:
+            lines += ["", "Counts:"]
+            lines += [f"  {name:<16}{value:>10}" for name, value in sorted(self.counts.items())]
+        if self.files:
+            lines += ["", f"Per-file latency ({self.files} files, avg {self.file_seconds / self.files * 1000:.1f} ms, "
+                          f"{self.bytes_read / 1024 / 1024:.2f} MB read):"]
+            for label, count in zip(self.bucket_labels(), self.histogram):
+                lines.append(f"  {label:<12}{count:>8}")
+            lines += ["", "Slowest files:"]
+            lines += [f"  {seconds * 1000:>9.1f} ms  {path}" for seconds, path in self.slowest]
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "started": self.started,
+            "total": round(self.total, 4),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "counts": self.counts,
+            "files": self.files,
+            "bytes_read": self.bytes_read,
+            "histogram": dict(zip(self.bucket_labels(), self.histogram)),
+            "slowest": [{"seconds": round(s, 4), "path": p} for s, p in self.slowest],
+        }
+
+    def append_to_log(self, path: Optional[str]):
+        """Append this job as one JSON line to a log file."""
+        if not path:
+            return
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.to_dict(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Failed to write timing log {path}: {e}")
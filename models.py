@@ -1,20 +1,97 @@
-from dataclasses import dataclass
-from pathlib import Path
+import os
+import sys
 from typing import Optional
 
-@dataclass
+
+# Descriptions longer than this are not kept in memory; they are read back
+# from metadata.json / the file's tags when something asks for them
+DESCRIPTION_INLINE_MAX = 256
+
+
+class _LazyDescription:
+    """Marks a description that exists on disk but is not loaded."""
+
+    def __reduce__(self):
+        # Unpickles as the same module-level marker
+        return "LAZY_DESCRIPTION"
+
+    def __repr__(self):
+        return "<lazy description>"
+
+
+LAZY_DESCRIPTION = _LazyDescription()
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
 class Audiobook:
-    path: Path
-    filename: str
-    title: str
-    author: str
-    series: Optional[str]
-    series_index: Optional[str]
-    source: str
-
-    # Optional ABS metadata fields
-    narrators: Optional[str] = None
-    year: Optional[str] = None
-    isbn: Optional[str] = None
-    asin: Optional[str] = None
-    description: Optional[str] = None
+    """One audio file with the metadata it should be tagged with.
+
+    Kept small because a library holds one per file: __slots__ instead of a
+    __dict__, the path as a plain string (filename is derived from it), and
+    author/series/narrators/source/year interned so repeated names share one
+    string. Pickles as a plain tuple, which keeps pool transfers cheap and
+    re-interns on the receiving side.
+    """
+
+    FIELDS = ("path", "title", "author", "series", "series_index", "source",
+              "narrators", "year", "isbn", "asin", "description")
+
+    # Same order as FIELDS, so _values() lines up with the constructor
+    __slots__ = ("path", "title", "author", "series", "series_index", "source",
+                 "narrators", "year", "isbn", "asin", "_description")
+
+    def __init__(self, path, title: str, author: str, series: Optional[str], series_index: Optional[str],
+                 source: str, narrators: Optional[str] = None, year: Optional[str] = None,
+                 isbn: Optional[str] = None, asin: Optional[str] = None, description: Optional[str] = None):
+        self.path = os.fspath(path)
+        self.title = title
+        self.author = _intern(author)
+        self.series = _intern(series)
+        self.series_index = series_index
+        self.source = _intern(source)
+        self.narrators = _intern(narrators)
+        self.year = _intern(year)
+        self.isbn = isbn
+        self.asin = asin
+        if isinstance(description, str) and len(description) > DESCRIPTION_INLINE_MAX:
+            description = LAZY_DESCRIPTION
+        self._description = description
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def description(self) -> Optional[str]:
+        if self._description is LAZY_DESCRIPTION:
+            from scanner import load_description
+            return load_description(self.path)
+        return self._description
+
+    @description.setter
+    def description(self, value: Optional[str]):
+        self._description = value
+
+    @property
+    def description_loaded(self) -> bool:
+        """False when description would be read from disk."""
+        return self._description is not LAZY_DESCRIPTION
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return Audiobook, self._values()
+
+    def __repr__(self):
+        return f"Audiobook(path={self.path!r}, title={self.title!r}, author={self.author!r})"
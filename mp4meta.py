@@ -0,0 +1,302 @@
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from mutagen.mp4 import MP4
+
+
+# ilst items that are never needed while scanning (cover art can be megabytes)
+SKIPPED_ITEMS = {b"covr"}
+# Anything bigger than this inside ilst is not a text tag worth reading
+MAX_ITEM_SIZE = 1024 * 1024
+
+
+@dataclass
+class MP4Metadata:
+    """Tags plus the atom layout around them, read without loading audio or covers."""
+    tags: Dict[str, list]
+    # Offset and size of the ilst atom and of the "free" atom next to it (if any)
+    ilst_offset: Optional[int] = None
+    ilst_size: int = 0
+    padding_size: int = 0
+    # Full atom size of every ilst item, keyed like tags (covers included)
+    item_sizes: Dict[str, int] = field(default_factory=dict)
+    # (offset, size) of every top level mdat atom
+    mdat: List[Tuple[int, int]] = field(default_factory=list)
+    # Seconds, from the movie header
+    duration: Optional[float] = None
+    file_size: int = 0
+    bytes_read: int = 0
+    reads: int = 0
+    # First cover image (JPEG/PNG bytes), only read when asked for
+    cover: Optional[bytes] = None
+
+
+class _RangeReader:
+    """Reads byte ranges through windows of block_size so neighbouring headers share one read.
+
+    The last few windows are kept, so going back to an atom near one read
+    earlier (moov after the mdat header, udta after the traks) is free. With
+    a large block_size the whole walk usually takes two or three reads,
+    which is what counts on network mounts.
+    """
+    WINDOWS = 4
+
+    def __init__(self, fileobj, block_size=4096):
+        self.fileobj = fileobj
+        self.block_size = block_size
+        # (start, bytes), most recent last
+        self.windows = []
+        self.bytes_read = 0
+        self.reads = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        end = offset + length
+        for start, buf in reversed(self.windows):
+            if start <= offset and end <= start + len(buf):
+                return buf[offset - start:end - start]
+
+        self.fileobj.seek(offset)
+        buf = self.fileobj.read(max(length, self.block_size))
+        self.windows = self.windows[1 - self.WINDOWS:] + [(offset, buf)]
+        self.bytes_read += len(buf)
+        self.reads += 1
+        return buf[:length]
+
+
+class _Unusual(Exception):
+    """The file is laid out in a way this reader does not handle."""
+
+
+def _children(reader: _RangeReader, start: int, end: int):
+    """Yield (name, offset, header_size, atom_size) for the atoms in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        size, name = struct.unpack(">I4s", reader.read(pos, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", reader.read(pos + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise _Unusual(f"bad atom size for {name!r} at {pos}")
+        yield name, pos, header, size
+        pos += size
+
+
+def _find(reader: _RangeReader, start: int, end: int, name: bytes):
+    for child in _children(reader, start, end):
+        if child[0] == name:
+            return child
+    return None
+
+
+def _parse_data(name: bytes, payload: bytes):
+    """Decode the payload of one 'data' atom into a plain Python value."""
+    if len(payload) < 8:
+        raise _Unusual("truncated data atom")
+    data_type = struct.unpack(">I", payload[:4])[0] & 0xFFFFFF
+    value = payload[8:]
+
+    if name in (b"disk", b"trkn"):
+        if len(value) < 6:
+            return None
+        return struct.unpack(">HH", value[2:6])
+    if data_type == 1 or name == b"----":
+        return value.decode("utf-8", errors="replace")
+    if data_type == 2:
+        return value.decode("utf-16-be", errors="replace")
+    if data_type == 21 and len(value) in (1, 2, 4, 8):
+        return int.from_bytes(value, "big", signed=True)
+    return None
+
+
+def _parse_mvhd(reader: _RangeReader, atom) -> Optional[float]:
+    """Duration in seconds from a movie header atom."""
+    _, offset, header, size = atom
+    body = reader.read(offset + header, min(size - header, 32))
+    if len(body) < 20:
+        return None
+    if body[0] == 1:
+        if len(body) < 32:
+            return None
+        timescale, duration = struct.unpack(">IQ", body[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", body[12:20])
+    return duration / timescale if timescale else None
+
+
+def _parse_item(reader: _RangeReader, offset: int, header: int, size: int, name: bytes):
+    """Return (key, values) for one ilst item."""
+    body_start = offset + header
+    body = reader.read(body_start, size - header)
+
+    key = name.decode("latin-1")
+    values = []
+    pos = 0
+    mean = name_str = None
+    while pos + 8 <= len(body):
+        child_size, child_name = struct.unpack(">I4s", body[pos:pos + 8])
+        if child_size < 8 or pos + child_size > len(body):
+            raise _Unusual(f"bad child atom in {key!r}")
+        payload = body[pos + 8:pos + child_size]
+        if child_name == b"data":
+            value = _parse_data(name, payload)
+            if value is not None:
+                values.append(value)
+        elif child_name == b"mean":
+            mean = payload[4:].decode("utf-8", errors="replace")
+        elif child_name == b"name":
+            name_str = payload[4:].decode("utf-8", errors="replace")
+        pos += child_size
+
+    if name == b"----":
+        if mean is None or name_str is None:
+            raise _Unusual("freeform atom without mean/name")
+        key = f"----:{mean}:{name_str}"
+    return key, values
+
+
+def _parse_cover(reader: _RangeReader, offset: int, header: int, size: int) -> Optional[bytes]:
+    """Image bytes of the first data atom of a covr item."""
+    body = reader.read(offset + header, size - header)
+    pos = 0
+    while pos + 8 <= len(body):
+        child_size, child_name = struct.unpack(">I4s", body[pos:pos + 8])
+        if child_size < 8 or pos + child_size > len(body):
+            raise _Unusual("bad child atom in 'covr'")
+        if child_name == b"data" and child_size > 16:
+            return body[pos + 16:pos + child_size]
+        pos += child_size
+    return None
+
+
+def read_metadata(path, covers: bool = False, block_size: int = 4096) -> Optional[MP4Metadata]:
+    """Read ilst tags by walking moov/udta/meta/ilst only.
+
+    mdat and (unless covers is set) cover art payloads are skipped with seeks.
+    block_size is the smallest read made. Returns None when the file does not
+    look like a plain MP4, so callers can fall back to mutagen.
+    """
+    try:
+        with open(path, "rb", buffering=0) as f:
+            file_size = os.fstat(f.fileno()).st_size
+            reader = _RangeReader(f, block_size)
+            meta = MP4Metadata(tags={}, file_size=file_size)
+
+            moov = None
+            for name, offset, header, size in _children(reader, 0, file_size):
+                if name == b"moov":
+                    moov = (offset, header, size)
+                elif name == b"mdat":
+                    meta.mdat.append((offset, size))
+            if moov is None:
+                return None
+
+            udta = mvhd = None
+            for child in _children(reader, moov[0] + moov[1], moov[0] + moov[2]):
+                if child[0] == b"mvhd":
+                    mvhd = child
+                elif child[0] == b"udta":
+                    udta = child
+                if mvhd and udta:
+                    break
+            if mvhd:
+                meta.duration = _parse_mvhd(reader, mvhd)
+            if udta is None:
+                meta.bytes_read, meta.reads = reader.bytes_read, reader.reads
+                return meta
+
+            udta_start = udta[1] + udta[2]
+            meta_atom = _find(reader, udta_start, udta[1] + udta[3], b"meta")
+            if meta_atom is None:
+                meta.bytes_read, meta.reads = reader.bytes_read, reader.reads
+                return meta
+
+            # ISO meta is a full box (4 bytes version/flags); QuickTime style is not
+            meta_start = meta_atom[1] + meta_atom[2]
+            meta_end = meta_atom[1] + meta_atom[3]
+            if reader.read(meta_start + 4, 4) != b"hdlr":
+                meta_start += 4
+
+            siblings = list(_children(reader, meta_start, meta_end))
+            names = [child[0] for child in siblings]
+            if b"ilst" not in names:
+                meta.bytes_read, meta.reads = reader.bytes_read, reader.reads
+                return meta
+
+            i = names.index(b"ilst")
+            _, ilst_offset, ilst_header, ilst_size = siblings[i]
+            meta.ilst_offset = ilst_offset
+            meta.ilst_size = ilst_size
+            # Same rule mutagen uses: only a free atom right before/after ilst counts
+            for j in (i - 1, i + 1):
+                if 0 <= j < len(siblings) and siblings[j][0] == b"free":
+                    meta.padding_size = siblings[j][3]
+                    break
+
+            for name, offset, header, size in _children(
+                    reader, ilst_offset + ilst_header, ilst_offset + ilst_size):
+                if name == b"covr" and covers and meta.cover is None:
+                    meta.cover = _parse_cover(reader, offset, header, size)
+                if name in SKIPPED_ITEMS or size > MAX_ITEM_SIZE:
+                    meta.item_sizes[name.decode("latin-1")] = size
+                    continue
+                key, values = _parse_item(reader, offset, header, size, name)
+                meta.item_sizes[key] = size
+                if values:
+                    meta.tags.setdefault(key, []).extend(values)
+
+            meta.bytes_read, meta.reads = reader.bytes_read, reader.reads
+            return meta
+    except (OSError, struct.error, _Unusual):
+        return None
+
+
+def tags_from_mutagen(tags) -> Dict[str, list]:
+    """Convert mutagen MP4Tags into the plain dict shape read_metadata returns."""
+    result = {}
+    if tags is None:
+        return result
+    for key, values in tags.items():
+        if key == "covr":
+            continue
+        plain = []
+        for value in values:
+            if isinstance(value, bytes):
+                value = value.decode("utf-8", errors="replace")
+            plain.append(value)
+        result[key] = plain
+    return result
+
+
+def read_tags(path, stats: Optional[Dict] = None, block_size: int = 4096) -> Dict[str, list]:
+    """Read tags with the header-only reader, falling back to mutagen.
+
+    stats (if given) receives "bytes_read", "reads", the audio payload size
+    and duration, and whether mutagen was needed.
+    """
+    meta = read_metadata(path, block_size=block_size)
+    if meta is not None:
+        if stats is not None:
+            stats["bytes_read"] = meta.bytes_read
+            stats["reads"] = meta.reads
+            stats["audio_size"] = sum(size for _, size in meta.mdat)
+            stats["duration"] = meta.duration
+        return meta.tags
+    if stats is not None:
+        # mutagen's reads are not tracked
+        stats["fallback"] = True
+    return tags_from_mutagen(MP4(path).tags)
+
+
+def read_cover(path) -> Optional[bytes]:
+    """The first cover image (JPEG/PNG bytes) of a file, or None."""
+    meta = read_metadata(path, covers=True)
+    if meta is not None:
+        return meta.cover
+    tags = MP4(path).tags
+    cover = tags.get("covr") if tags else None
+    return bytes(cover[0]) if cover else None
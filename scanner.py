@@ -1,9 +1,17 @@
 import os
-import re
+import sys
+import json
+import time
+import queue
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional, Dict
-from mutagen.mp4 import MP4
+from typing import Optional, Dict, Iterator, List, Tuple
 from models import Audiobook
+from mp4meta import read_tags
+from index import ScanIndex
+from metrics import JobMetrics
+from series import get_parser
 
 
 def safe_str(val):
@@ -15,9 +23,370 @@ def safe_str(val):
     return str(val)
 
 
+AUDIO_EXTENSIONS = (".m4b", ".m4a")
+SIDECAR_NAMES = ("metadata.json", "abs_metadata.json")
+# Appended to a book's source when its series index was guessed from the file name
+FILE_INDEX_SOURCE = " (File #)"
+
+
+def load_sidecar(directory: str, names=SIDECAR_NAMES) -> Optional[Dict]:
+    """Load the first readable ABS metadata sidecar among names in a directory."""
+    for j_name in names:
+        try:
+            with open(os.path.join(directory, j_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return None
+
+
+def load_description(path) -> str:
+    """Read a book's description the way parse_book does (sidecar first, then the comment tag).
+
+    Used by Audiobook for long descriptions that are not kept in memory.
+    """
+    json_data = load_sidecar(os.path.dirname(path))
+    if json_data and json_data.get("description"):
+        return safe_str(json_data.get("description"))
+    try:
+        comment = read_tags(path).get("\xa9cmt")
+    except Exception:
+        return ""
+    return safe_str(comment[0]) if comment else ""
+
+
 class LibraryScanner:
+    # Below this many changed files, process startup costs more than it saves
+    PARALLEL_MIN_FILES = 64
+    # Remote mode (network mounts, where each round trip costs milliseconds):
+    # threads listing directories and parsing files at the same time
+    REMOTE_THREADS = 32
+    # and the smallest read made of a file, enough for most moov/udta walks
+    REMOTE_BLOCK_SIZE = 256 * 1024
+
+    @staticmethod
+    def add_to_library(library, book):
+        author_key = book.author
+        if author_key not in library:
+            library[author_key] = {}
+
+        series_key = book.series if book.series else "Standalone Books"
+        if series_key not in library[author_key]:
+            library[author_key][series_key] = []
+
+        library[author_key][series_key].append(book)
+
+    @staticmethod
+    def remove_from_library(library, book):
+        """Undo add_to_library for one book, dropping series and authors left empty."""
+        series_key = book.series if book.series else "Standalone Books"
+        books = library.get(book.author, {}).get(series_key, [])
+        books[:] = [b for b in books if b.path != book.path]
+        if not books and series_key in library.get(book.author, {}):
+            del library[book.author][series_key]
+            if not library[book.author]:
+                del library[book.author]
+
+    @staticmethod
+    def scan(root: str, index_path=None, workers: int = 1, stats: Optional[Dict] = None,
+             metrics: Optional[JobMetrics] = None, series_patterns: Tuple[str, ...] = (),
+             remote: bool = False) -> Iterator[List[Audiobook]]:
+        """Yield lists of books under root as each directory is resolved.
+
+        Unchanged files come from the scan index at index_path; changed ones are
+        parsed inline or, with workers > 1, on a process pool. stats (if given)
+        receives "total" and "reused" file counts, metrics per-phase timings.
+        series_patterns are extra series patterns, see series.SeriesParser.
+
+        remote trades bandwidth for round trips, for libraries on network
+        mounts: directories are listed and stat'ed by REMOTE_THREADS threads,
+        files are parsed on as many threads (workers is ignored) and read in
+        REMOTE_BLOCK_SIZE blocks.
+        """
+        root = os.path.abspath(root)
+        series_patterns = tuple(series_patterns)
+        # Rows parsed with other series patterns do not count as unchanged
+        series_signature = get_parser(series_patterns).signature
+        workers = max(1, int(workers))
+        if stats is None:
+            stats = {}
+        stats.update(total=0, reused=0)
+        if metrics is None:
+            metrics = JobMetrics("scan")
+
+        # Cached rows from previous scans; only changed files get re-parsed
+        with metrics.phase("index"):
+            index = ScanIndex(index_path) if index_path else None
+            cached = index.load(root) if index else {}
+        seen = set()
+        changed_files = 0
+
+        # Parsed directories arrive here, either inline or from pool callbacks
+        done = queue.Queue()
+        in_flight = 0
+        executor = None
+        pool_broken = False
+
+        def on_parsed(job, future):
+            # Runs on the pool's callback thread; always hand something to the queue
+            try:
+                result = future.result()
+            except Exception as e:
+                # A crashed worker (BrokenProcessPool) or an error it raised;
+                # the directory is parsed again on the scan thread
+                result = e
+            done.put((job, result))
+
+        def parse_inline(job):
+            directory, changed, _, sidecars = job
+            names = [name for name, _, _ in changed]
+            try:
+                return LibraryScanner.parse_directory_timed(directory, names, sidecars, series_patterns, block_size)
+            except Exception as e:
+                # stderr: cli.py scan prints its books on stdout
+                print(f"Failed to parse {directory}: {e}", file=sys.stderr)
+                metrics.count("failed directory")
+                return [], 0.0, []
+
+        def store_parsed(job, result):
+            if isinstance(result, Exception):
+                metrics.count("pool failure")
+                result = parse_inline(job)
+            directory, changed, sidecar_key, _ = job
+            books, sidecar_seconds, file_stats = result
+            metrics.add_phase("sidecar", sidecar_seconds)
+            stored = []
+            for (name, size, mtime), book, stats in zip(changed, books, file_stats):
+                metrics.add_phase("parse", stats["seconds"])
+                metrics.record_file(os.path.join(directory, name), stats["seconds"], stats.get("bytes_read", 0))
+                if stats.get("fallback"):
+                    metrics.count("mutagen fallback")
+                if book:
+                    if index:
+                        with metrics.phase("index"):
+                            index.store(book, size, mtime, sidecar_key,
+                                        stats.get("audio_size"), stats.get("duration"))
+                    stored.append(book)
+            return stored
+
+        block_size = 4096
+        if remote:
+            block_size = LibraryScanner.REMOTE_BLOCK_SIZE
+            executor = ThreadPoolExecutor(LibraryScanner.REMOTE_THREADS)
+            workers = LibraryScanner.REMOTE_THREADS
+            walk = LibraryScanner.iter_directories_threaded(root, LibraryScanner.REMOTE_THREADS)
+        else:
+            walk = ((directory, audio, sidecars, None)
+                     for directory, audio, sidecars in LibraryScanner.iter_directories(root))
+
+        def file_stat(directory, name, listed):
+            # (size, mtime_ns) from the listing when there is one, else one stat call
+            if listed is not None:
+                return listed.get(name)
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                return None
+            return st.st_size, st.st_mtime_ns
+
+        try:
+            for directory, file_names, sidecars, listed in metrics.timed_iter(walk, "walk"):
+                stat_start = time.perf_counter()
+                mtimes = []
+                for j_name in SIDECAR_NAMES:
+                    st = file_stat(directory, j_name, listed) if j_name in sidecars else None
+                    mtimes.append(st[1] if st else None)
+                sidecar_key = ScanIndex.sidecar_key(mtimes)
+                if series_signature:
+                    sidecar_key += f"/{series_signature}"
+
+                found = []
+                changed = []
+                for name in file_names:
+                    file_path = os.path.join(directory, name)
+                    st = file_stat(directory, name, listed)
+                    if st is None:
+                        continue
+
+                    stats["total"] += 1
+                    seen.add(file_path)
+                    entry = cached.get(file_path)
+                    if entry and entry[:3] == (*st, sidecar_key):
+                        found.append(entry[3])
+                        stats["reused"] += 1
+                    else:
+                        changed.append((name, *st))
+                metrics.add_phase("stat", time.perf_counter() - stat_start)
+
+                if changed:
+                    changed_files += len(changed)
+                    job = (directory, changed, sidecar_key, sidecars)
+                    names = [name for name, _, _ in changed]
+
+                    if (executor is None and not pool_broken and workers > 1
+                            and changed_files >= LibraryScanner.PARALLEL_MIN_FILES):
+                        # spawn, not fork: the GUI calls this from a QThread
+                        executor = ProcessPoolExecutor(max_workers=workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+
+                    future = None
+                    if executor:
+                        try:
+                            future = executor.submit(LibraryScanner.parse_directory_timed, directory, names,
+                                                     sidecars, series_patterns, block_size)
+                        except BrokenExecutor as e:
+                            # Directories already submitted come back through on_parsed
+                            # and are re-parsed; the rest of the scan runs inline
+                            print(f"Parse workers failed ({e}); continuing without them", file=sys.stderr)
+                            executor.shutdown(wait=False)
+                            executor = None
+                            pool_broken = True
+                    if future is not None:
+                        future.add_done_callback(lambda f, job=job: on_parsed(job, f))
+                        in_flight += 1
+                        # Keep submissions bounded so discovery cannot run far ahead
+                        while in_flight > workers * 16:
+                            found.extend(store_parsed(*done.get()))
+                            in_flight -= 1
+                    else:
+                        done.put((job, parse_inline(job)))
+                        in_flight += 1
+
+                while not done.empty():
+                    found.extend(store_parsed(*done.get()))
+                    in_flight -= 1
+                if found:
+                    yield found
+
+            while in_flight:
+                yield store_parsed(*done.get())
+                in_flight -= 1
+
+            if index:
+                # Drop rows for files that were deleted since the last scan
+                with metrics.phase("index"):
+                    index.remove(set(cached) - seen)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if index:
+                index.close()
+            metrics.count("files", stats["total"])
+            metrics.count("from index", stats["reused"])
+
+    @staticmethod
+    def iter_directories_threaded(root: str, threads: int
+                                  ) -> Iterator[Tuple[str, List[str], List[str], Dict[str, Tuple[int, int]]]]:
+        """Like iter_directories, listing up to threads directories at once.
+
+        Also yields {name: (size, mtime_ns)} for the audio and sidecar files,
+        taken from the directory entries (free on Windows, and done on the
+        listing threads elsewhere), so the scan makes no stat calls of its
+        own. Directories come in no particular order.
+        """
+        def list_directory(directory):
+            audio = []
+            names = set()
+            subdirs = []
+            stats = {}
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                                continue
+                            names.add(entry.name)
+                            is_audio = entry.name.lower().endswith(AUDIO_EXTENSIONS)
+                            if is_audio or entry.name in SIDECAR_NAMES:
+                                st = entry.stat()
+                                stats[entry.name] = (st.st_size, st.st_mtime_ns)
+                                if is_audio:
+                                    audio.append(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                return directory, [], [], [], {}
+            return directory, sorted(audio), [n for n in SIDECAR_NAMES if n in names], subdirs, stats
+
+        with ThreadPoolExecutor(max(1, threads)) as pool:
+            pending = {pool.submit(list_directory, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, audio, sidecars, subdirs, stats = future.result()
+                    pending.update(pool.submit(list_directory, path) for path in subdirs)
+                    if audio:
+                        yield directory, audio, sidecars, stats
+
+    @staticmethod
+    def iter_directories(root: str, all_dirs: bool = False,
+                         prune=None) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Yield (directory, audio file names, sidecar names) for each directory holding audio.
+
+        Walks lazily with os.scandir, so parsing can start before discovery ends.
+        With all_dirs, directories without audio are yielded too; subdirectories
+        for which prune(path) is true are not entered.
+        """
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            audio = []
+            names = set()
+            subdirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if not (prune and prune(entry.path)):
+                                    subdirs.append(entry.path)
+                                continue
+                        except OSError:
+                            continue
+                        names.add(entry.name)
+                        if entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                            audio.append(entry.name)
+            except OSError:
+                continue
+
+            if audio or all_dirs:
+                yield directory, sorted(audio), [n for n in SIDECAR_NAMES if n in names]
+            stack.extend(sorted(subdirs, reverse=True))
+
+    @staticmethod
+    def parse_directory(directory: str, file_names: List[str], sidecars: List[str],
+                        series_patterns: Tuple[str, ...] = ()) -> List[Optional[Audiobook]]:
+        """Parse audio files of one directory, loading its sidecar only once."""
+        return LibraryScanner.parse_directory_timed(directory, file_names, sidecars, series_patterns)[0]
+
+    @staticmethod
+    def parse_directory_timed(directory: str, file_names: List[str], sidecars: List[str],
+                              series_patterns: Tuple[str, ...] = (), block_size: int = 4096):
+        """parse_directory plus (books, sidecar seconds, per-file stats dicts).
+
+        The stats hold "seconds" and whatever read_tags reported. Takes and
+        returns plain picklable data so it can run in scan pool processes.
+        """
+        start = time.perf_counter()
+        json_data = load_sidecar(directory, sidecars) if sidecars else None
+        sidecar_seconds = time.perf_counter() - start
+
+        parser = get_parser(series_patterns)
+        books = []
+        file_stats = []
+        for name in file_names:
+            stats = {}
+            start = time.perf_counter()
+            books.append(LibraryScanner.parse_book(Path(os.path.join(directory, name)), json_data, stats, parser,
+                                                   block_size))
+            stats["seconds"] = time.perf_counter() - start
+            file_stats.append(stats)
+        return books, sidecar_seconds, file_stats
+
     @staticmethod
-    def parse_book(path: Path, json_data: Optional[Dict]) -> Optional[Audiobook]:
+    def parse_book(path: Path, json_data: Optional[Dict], stats: Optional[Dict] = None,
+                   parser=None, block_size: int = 4096) -> Optional[Audiobook]:
         title = None
         author = None
         series_str = None
@@ -42,40 +411,40 @@ class LibraryScanner:
 
             # Optional ABS metadata
             narrators = json_data.get("narrators")
-            year = json_data.get("published_year")
+            year = json_data.get("published_year") or json_data.get("publishedYear")
             isbn = json_data.get("isbn")
             asin = json_data.get("asin")
             description = json_data.get("description")
 
         # 2. Fallback to Tags if JSON missing
         try:
-            audio = MP4(path)
+            tags = read_tags(path, stats, block_size)
 
             if not title:
-                title = audio.tags.get("\xa9nam", [path.stem])[0]
+                title = tags.get("\xa9nam", [path.stem])[0]
             if not author:
-                author = audio.tags.get("\xa9ART", ["Unknown"])[0]
+                author = tags.get("\xa9ART", ["Unknown"])[0]
             if not series_str:
-                series_str = audio.tags.get("\xa9grp", [None])[0]
+                series_str = tags.get("\xa9grp", [None])[0]
 
             if not narrators:
-                narrators_tag = audio.tags.get("----:com.apple.iTunes:Narrators")
+                narrators_tag = tags.get("----:com.apple.iTunes:Narrators")
                 if narrators_tag:
                     narrators = str(narrators_tag[0])
             if not year:
-                year_tag = audio.tags.get("\xa9day")
+                year_tag = tags.get("\xa9day")
                 if year_tag:
                     year = str(year_tag[0])
             if not isbn:
-                isbn_tag = audio.tags.get("----:com.apple.iTunes:ISBN")
+                isbn_tag = tags.get("----:com.apple.iTunes:ISBN")
                 if isbn_tag:
                     isbn = str(isbn_tag[0])
             if not asin:
-                asin_tag = audio.tags.get("----:com.apple.iTunes:ASIN")
+                asin_tag = tags.get("----:com.apple.iTunes:ASIN")
                 if asin_tag:
                     asin = str(asin_tag[0])
             if not description:
-                desc_tag = audio.tags.get("\xa9cmt")
+                desc_tag = tags.get("\xa9cmt")
                 if desc_tag:
                     description = str(desc_tag[0])
 
@@ -89,21 +458,17 @@ class LibraryScanner:
         series_idx = None
 
         if series_str:
-            match = re.search(r"^(.*)\s+#(\d+(\.\d+)?)$", series_str)
-            if match:
-                series_name = match.group(1).strip()
-                series_idx = match.group(2)
-            else:
-                series_name = series_str
+            if parser is None:
+                parser = get_parser()
+            series_name, series_idx = parser.parse(str(series_str))
+            if series_idx is None:
                 # Fallback to file number
-                file_num_match = re.search(r"(\d+)", path.name)
-                if file_num_match:
-                    series_idx = file_num_match.group(1)
-                    source += " (File #)"
+                series_idx = parser.parse_filename(path.stem)
+                if series_idx is not None:
+                    source += FILE_INDEX_SOURCE
 
         return Audiobook(
             path=path,
-            filename=path.name,
             title=safe_str(title),
             author=safe_str(author),
             series=safe_str(series_name),
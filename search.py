@@ -0,0 +1,146 @@
+import bisect
+import re
+from typing import Dict, List, Optional, Set
+
+from models import Audiobook
+
+
+TEXT_FIELDS = ("title", "author", "series", "narrators")
+ID_FIELDS = ("isbn", "asin")
+
+_TOKEN = re.compile(r"\w+")
+# Below this many new words the sorted vocabulary is patched instead of re-sorted
+_INSORT_LIMIT = 1000
+# Candidate sets up to this size are narrowed book by book
+_FILTER_LIMIT = 256
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(text.casefold()) if text else []
+
+
+def normalize_id(value: Optional[str]) -> str:
+    """ISBN/ASIN without separators, so "978-0-7653" matches "97807653"."""
+    return re.sub(r"[\s-]", "", value).casefold() if value else ""
+
+
+class SearchIndex:
+    """Word/prefix index over the library plus exact ISBN/ASIN lookup.
+
+    Every query word must match (as a prefix) a word of the title, author,
+    series, narrators or IDs of a book. Books are keyed by path and can be
+    added, updated or removed one at a time.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}
+        self._ids: Dict[str, Set[str]] = {}
+        self._book_words: Dict[str, Set[str]] = {}
+        self._book_ids: Dict[str, Set[str]] = {}
+        # Sorted vocabulary for prefix lookups, patched lazily on the next query
+        self._words: List[str] = []
+        self._new_words: Set[str] = set()
+        self._dead_words = 0
+
+    def __len__(self):
+        return len(self._book_words)
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, book: Audiobook):
+        """Index a book, replacing what was indexed for its path before."""
+        key = book.path
+        if key in self._book_words:
+            self.remove(key)
+
+        ids = {normalize_id(getattr(book, name)) for name in ID_FIELDS} - {""}
+        words = set(ids)
+        for name in TEXT_FIELDS:
+            words.update(tokenize(getattr(book, name)))
+
+        for word in words:
+            paths = self._postings.get(word)
+            if paths is None:
+                paths = self._postings[word] = set()
+                self._new_words.add(word)
+            paths.add(key)
+        for value in ids:
+            self._ids.setdefault(value, set()).add(key)
+        self._book_words[key] = words
+        self._book_ids[key] = ids
+
+    def remove(self, path):
+        for word in self._book_words.pop(path, ()):
+            paths = self._postings[word]
+            paths.discard(path)
+            if not paths:
+                # Left in the sorted vocabulary until the next rebuild
+                del self._postings[word]
+                self._new_words.discard(word)
+                self._dead_words += 1
+        for value in self._book_ids.pop(path, ()):
+            paths = self._ids[value]
+            paths.discard(path)
+            if not paths:
+                del self._ids[value]
+
+    def _vocabulary(self) -> List[str]:
+        if self._new_words or self._dead_words:
+            if len(self._new_words) < _INSORT_LIMIT and self._dead_words < len(self._words) // 2:
+                for word in self._new_words:
+                    # A removed word can come back while still in the list
+                    i = bisect.bisect_left(self._words, word)
+                    if i == len(self._words) or self._words[i] != word:
+                        self._words.insert(i, word)
+            else:
+                self._words = sorted(self._postings)
+                self._dead_words = 0
+            self._new_words = set()
+        return self._words
+
+    def prepare(self):
+        """Sort the vocabulary now (e.g. after a scan) instead of on the first query."""
+        self._vocabulary()
+
+    def _prefix_matches(self, prefix: str) -> Set[str]:
+        words = self._vocabulary()
+        result = set()
+        i = bisect.bisect_left(words, prefix)
+        while i < len(words) and words[i].startswith(prefix):
+            paths = self._postings.get(words[i])
+            if paths:
+                result |= paths
+            i += 1
+        return result
+
+    def search(self, query: str) -> Optional[Set[str]]:
+        """Paths of matching books, or None when the query is empty (no filter)."""
+        query = query.strip()
+        if not query:
+            return None
+
+        # A whole query equal to an ISBN/ASIN is an exact lookup
+        exact = self._ids.get(normalize_id(query))
+        if exact:
+            return set(exact)
+
+        words = tokenize(query)
+        if not words:
+            return None
+        # Longest word first: it matches the fewest books. Once few candidates
+        # are left, the other words are checked per book instead of unioning
+        # everything they prefix-match.
+        words = sorted(set(words), key=len, reverse=True)
+        result = self._prefix_matches(words[0])
+        for word in words[1:]:
+            # Single letters prefix-match most of the vocabulary, so they are
+            # always checked per candidate rather than looked up
+            if len(result) <= _FILTER_LIMIT or len(word) == 1:
+                result = {path for path in result
+                          if any(w.startswith(word) for w in self._book_words[path])}
+            else:
+                result &= self._prefix_matches(word)
+            if not result:
+                break
+        return result
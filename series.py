@@ -0,0 +1,133 @@
+"""Series string parsing: "Name #3", "Name, Book 3", "Name Vol. 2", "Name (3)", "3.5 - Name".
+
+The same series strings recur for every file of a series, so results are
+memoized per input string. get_parser() keeps one parser per pattern set
+in each process, so scan workers only receive the extra pattern strings.
+"""
+import hashlib
+import math
+import re
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+_NUM = r"(?P<index>\d+(?:\.\d+)?)"
+_NUM_SHORT = r"(?P<index>\d{1,3}(?:\.\d+)?)"
+_WORDS = r"(?:book|bk|volume|vol|part|pt|no|number|tome|band)"
+
+# Tried in order on a series string; each names a "name" and an "index" group
+SERIES_PATTERNS = (
+    rf"^(?P<name>.+?)\s*#\s*{_NUM}$",
+    rf"^(?P<name>.+?)[\s,;:\-–]+{_WORDS}\.?\s*{_NUM}$",
+    # At most three digits in brackets: "(2015)" is a year
+    rf"^(?P<name>.+?)\s*[(\[]\s*(?:{_WORDS}\.?\s*|#\s*)?{_NUM_SHORT}\s*[)\]]$",
+    rf"^(?P<name>.+?),\s*{_NUM}$",
+    rf"^{_NUM}\s*[-–:.]\s+(?P<name>.+)$",
+)
+
+# Tried in order on a file name (without extension) when the series string
+# has no index; "index" group only. Parts are left out, they number files.
+FILENAME_PATTERNS = (
+    rf"\b(?:book|bk|volume|vol|no|tome|band)\.?\s*{_NUM}",
+    rf"#\s*{_NUM}",
+    rf"^{_NUM}\s*[-–_.:]",
+    rf"[(\[]\s*{_NUM_SHORT}\s*[)\]]",
+)
+
+# Last resort, as before: the first number anywhere in the file name
+_FIRST_NUMBER = re.compile(r"(\d+)")
+
+
+def normalize_index(index: str) -> str:
+    """"03" -> "3", "2.50" -> "2.5", "1.0" -> "1"."""
+    whole, _, fraction = index.partition(".")
+    whole = str(int(whole)) if whole else "0"
+    fraction = fraction.rstrip("0")
+    return f"{whole}.{fraction}" if fraction else whole
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.split()).strip(" ,;:-–")
+
+
+@lru_cache(maxsize=4096)
+def index_sort_key(index: Optional[str]) -> float:
+    """Numeric sort key of a series index; books without one sort last.
+
+    Indexes that are not plain numbers ("1-3", "II") sort by their leading
+    number, or last if they have none.
+    """
+    if not index:
+        return math.inf
+    try:
+        return float(index)
+    except ValueError:
+        match = re.match(r"\s*(\d+(?:\.\d+)?)", index)
+        return float(match.group(1)) if match else math.inf
+
+
+class SeriesParser:
+    """Splits series strings into (name, index) using ordered pattern sets.
+
+    extra_patterns are tried before the built-in series patterns, so a
+    library with its own convention can be taught it without losing the rest.
+    """
+
+    # Unique series strings kept per parser; well above any real library
+    CACHE_MAX = 100_000
+
+    def __init__(self, extra_patterns: Iterable[str] = (), series_patterns=SERIES_PATTERNS,
+                 filename_patterns=FILENAME_PATTERNS):
+        extra, series, filename = self.patterns = (tuple(extra_patterns), tuple(series_patterns),
+                                                   tuple(filename_patterns))
+        self.series_res = [re.compile(p, re.IGNORECASE) for p in extra + series]
+        for regex in self.series_res:
+            if not {"name", "index"} <= set(regex.groupindex):
+                raise ValueError(f"Series pattern needs (?P<name>...) and (?P<index>...) groups: {regex.pattern}")
+        self.filename_res = [re.compile(p, re.IGNORECASE) for p in filename]
+        self.cache = {}
+
+    @property
+    def signature(self) -> str:
+        """Empty for the built-in patterns, else a short hash of the pattern sets."""
+        if self.patterns == ((), SERIES_PATTERNS, FILENAME_PATTERNS):
+            return ""
+        return hashlib.blake2b(repr(self.patterns).encode(), digest_size=6).hexdigest()
+
+    def parse(self, text: str) -> Tuple[str, Optional[str]]:
+        """(series name, normalized index or None) of a series string."""
+        result = self.cache.get(text)
+        if result is None:
+            if len(self.cache) >= self.CACHE_MAX:
+                self.cache.clear()
+            result = self.cache[text] = self._parse(text)
+        return result
+
+    def _parse(self, text: str) -> Tuple[str, Optional[str]]:
+        text = text.strip()
+        for regex in self.series_res:
+            match = regex.match(text)
+            if match and match.group("name").strip():
+                return normalize_name(match.group("name")), normalize_index(match.group("index"))
+        return normalize_name(text), None
+
+    def parse_filename(self, stem: str, first_number: bool = True) -> Optional[str]:
+        """Series index found in a file name, or None.
+
+        With first_number, any number counts when no pattern matches (the
+        old behaviour, which also picks up track numbers and years).
+        """
+        for regex in self.filename_res:
+            match = regex.search(stem)
+            if match:
+                return normalize_index(match.group("index"))
+        if first_number:
+            match = _FIRST_NUMBER.search(stem)
+            if match:
+                return normalize_index(match.group(1))
+        return None
+
+
+@lru_cache(maxsize=16)
+def get_parser(extra_patterns: Tuple[str, ...] = ()) -> SeriesParser:
+    """Shared parser (and memo) per pattern set, one per process."""
+    return SeriesParser(extra_patterns)
@@ -0,0 +1,142 @@
+"""Writes Audiobookshelf metadata.json sidecars from scanned books.
+
+One sidecar per directory, built from the directory's books and merged into
+the sidecar already there (chapters, genres and other keys this tool does not
+know are kept). Files are replaced atomically and left alone when their
+content would not change.
+"""
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from models import Audiobook
+from scanner import FILE_INDEX_SOURCE, SIDECAR_NAMES
+
+STATUSES = ("created", "updated", "unchanged", "conflict", "failed")
+
+
+def write_json_atomic(path, data):
+    """Write data as JSON through a temp file and a rename, so readers never see half a file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metadata-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        except OSError:
+            os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _split_names(value: Optional[str]) -> List[str]:
+    # The scanner joins name lists with ", "
+    return [name.strip() for name in value.split(",") if name.strip()] if value else []
+
+
+def _keep_rest(existing, first: Optional[str]) -> List[str]:
+    """first followed by what an existing list holds after its first entry.
+
+    The scanner only reads the first author and series, so the others are kept.
+    """
+    rest = existing[1:] if isinstance(existing, list) else []
+    return ([first] if first else []) + rest
+
+
+def sidecar_data(book: Audiobook, existing: Optional[Dict] = None) -> Dict:
+    """existing (or an empty sidecar) updated with book's metadata."""
+    data = dict(existing or {})
+    data["title"] = book.title or None
+    data["authors"] = _keep_rest(data.get("authors"), book.author)
+    # An index guessed from the file name is not written as if it were known
+    index = None if book.source.endswith(FILE_INDEX_SOURCE) else book.series_index
+    series = f"{book.series} #{index}" if book.series and index else book.series
+    data["series"] = _keep_rest(data.get("series"), series)
+    narrators = data.get("narrators")
+    if not (isinstance(narrators, list) and ", ".join(map(str, narrators)) == book.narrators):
+        data["narrators"] = _split_names(book.narrators)
+    # Older exports name the year published_year, which the scanner reads too
+    data["published_year" if "published_year" in data else "publishedYear"] = book.year or None
+    data["isbn"] = book.isbn or None
+    data["asin"] = book.asin or None
+    # A description that is not kept in memory came from this sidecar or the
+    # file's comment tag; only the latter needs reading
+    if book.description_loaded or not (existing and existing.get("description")):
+        data["description"] = book.description or None
+    return data
+
+
+def _existing_sidecar(directory: str):
+    """(path to update, its data or None); metadata.json when there is none yet."""
+    for name in SIDECAR_NAMES:
+        path = os.path.join(directory, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return path, json.load(f)
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError):
+            # Same order the scanner tries them in; an unreadable one is replaced
+            return path, None
+    return os.path.join(directory, SIDECAR_NAMES[0]), None
+
+
+def export_directory(directory: str, books: List[Audiobook], dry_run: bool = False) -> str:
+    """Write the sidecar of one directory; returns one of STATUSES.
+
+    Directories whose books would need different sidecars (several books
+    in one folder) are reported as "conflict" and not touched.
+    """
+    path, existing = _existing_sidecar(directory)
+    books = sorted(books, key=lambda b: b.path)
+    data = sidecar_data(books[0], existing)
+    for other in books[1:]:
+        other_data = sidecar_data(other, existing)
+        other_data["description"] = data.get("description")
+        if other_data != data:
+            return "conflict"
+    if data == existing:
+        return "unchanged"
+    if not dry_run:
+        write_json_atomic(path, data)
+    return "updated" if existing is not None else "created"
+
+
+def export_sidecars(books: Iterable[Audiobook], threads: int = 8, dry_run: bool = False,
+                    on_item: Callable[[str, str], None] = lambda directory, status: None) -> Dict[str, int]:
+    """Write metadata.json for the directories holding books.
+
+    Directories are handled on a small thread pool since the work is
+    mostly waiting on the disk. Returns counts per status; on_item
+    (directory, status) follows each directory, on the calling thread.
+    """
+    by_directory: Dict[str, List[Audiobook]] = {}
+    for book in books:
+        by_directory.setdefault(os.path.dirname(book.path), []).append(book)
+
+    def export(item):
+        directory, group = item
+        try:
+            return export_directory(directory, group, dry_run)
+        except Exception as e:
+            print(f"Failed to write metadata.json in {directory}: {e}")
+            return "failed"
+
+    counts = dict.fromkeys(STATUSES, 0)
+    items = sorted(by_directory.items())
+    with ThreadPoolExecutor(max(1, threads)) as pool:
+        for (directory, _), status in zip(items, pool.map(export, items)):
+            counts[status] += 1
+            on_item(directory, status)
+    return counts
@@ -1,6 +1,40 @@
-from typing import Optional
-from mutagen.mp4 import MP4
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from mutagen.mp4 import MP4, MP4FreeForm
+from metrics import JobMetrics
 from models import Audiobook
+from mp4meta import MP4Metadata, read_metadata, tags_from_mutagen
+
+
+NARRATORS_KEY = "----:com.apple.iTunes:Narrators"
+ISBN_KEY = "----:com.apple.iTunes:ISBN"
+ASIN_KEY = "----:com.apple.iTunes:ASIN"
+
+# Padding reserved whenever a save has to rewrite the file anyway,
+# so later edits (e.g. a longer description) fit in place
+REWRITE_PADDING = 128 * 1024
+
+
+@dataclass
+class TagPlan:
+    """What syncing one file would do to it."""
+    # (book, series, index) payload entries for this file, in payload order
+    entries: List[Tuple[Audiobook, Optional[str], Optional[str]]]
+    changes: Dict[str, Optional[list]]
+    # Values the changed tags had before (None: not present), for the journal
+    original: Dict[str, Optional[list]] = field(default_factory=dict)
+    # True if the new tags do not fit the existing ilst + padding
+    rewrite: bool = False
+    # Bytes mutagen has to move for a rewrite (everything after ilst)
+    rewrite_bytes: int = 0
+
+    @property
+    def book(self) -> Audiobook:
+        return self.entries[-1][0]
 
 
 class TagEditor:
@@ -26,4 +60,341 @@ class TagEditor:
             return True
         except Exception as e:
             print(f"Failed to update {book.filename}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def desired_tags(book: Audiobook, series: Optional[str], index: Optional[str]) -> Dict[str, Optional[list]]:
+        """Tags a sync should leave in the file; None marks a tag to delete.
+
+        Values use the plain shape of mp4meta.read_tags (freeform atoms as str).
+        """
+        # Helper to wrap normal text fields as list of strings
+        def list_str(val):
+            return [str(val)] if val is not None else [""]
+
+        # Apply standard tags from ABS metadata
+        tags = {
+            "\xa9nam": list_str(book.title),
+            "\xa9ART": list_str(book.author),
+            "aART": list_str(book.author),
+        }
+
+        if series and series != "Standalone Books":
+            tags["\xa9grp"] = list_str(series)
+            tags["\xa9alb"] = list_str(series)
+        else:
+            tags["\xa9grp"] = None
+            tags["\xa9alb"] = None
+
+        # Series index / disk
+        if index:
+            try:
+                tags["disk"] = [(int(float(index)), 0)]
+            except ValueError:
+                pass
+
+        # Optional ABS metadata fields
+        if getattr(book, "narrators", None):
+            tags[NARRATORS_KEY] = [book.narrators]
+        if getattr(book, "year", None):
+            tags["\xa9day"] = list_str(book.year)
+        if getattr(book, "isbn", None):
+            tags[ISBN_KEY] = [book.isbn]
+        if getattr(book, "asin", None):
+            tags[ASIN_KEY] = [book.asin]
+        if getattr(book, "description", None):
+            tags["\xa9cmt"] = list_str(book.description)
+
+        return tags
+
+    @staticmethod
+    def diff_tags(current: Dict[str, list], desired: Dict[str, Optional[list]]) -> Dict[str, Optional[list]]:
+        """Return only the desired tags that differ from what the file already has."""
+        changes = {}
+        for key, value in desired.items():
+            if value is None:
+                if key in current:
+                    changes[key] = None
+            elif current.get(key) != value:
+                changes[key] = value
+        return changes
+
+    @staticmethod
+    def apply_changes(audio: MP4, changes: Dict[str, Optional[list]]):
+        """Write a diff from diff_tags into a loaded mutagen MP4 (without saving)."""
+        if audio.tags is None:
+            audio.add_tags()
+
+        for key, value in changes.items():
+            if value is None:
+                if key in audio.tags:
+                    del audio.tags[key]
+            elif key.startswith("----:"):
+                # Freeform tags need MP4FreeForm wrapper
+                audio.tags[key] = [MP4FreeForm(str(v).encode("utf-8")) for v in value]
+            else:
+                audio.tags[key] = value
+
+    @staticmethod
+    def item_size(key: str, value: list) -> int:
+        """Size mutagen renders for one ilst item (same layout as its MP4Tags.save)."""
+        if key in ("disk", "trkn"):
+            payload = [6 if key == "disk" else 8 for _ in value]
+        else:
+            payload = [len(str(v).encode("utf-8")) for v in value]
+        size = 8 + sum(16 + p for p in payload)
+        if key.startswith("----:"):
+            _, mean, name = key.split(":", 2)
+            size += 12 + len(mean.encode("utf-8")) + 12 + len(name.encode("utf-8"))
+        return size
+
+    @staticmethod
+    def needs_rewrite(meta: Optional[MP4Metadata], changes: Dict[str, Optional[list]]) -> bool:
+        """Predict whether saving changes forces mutagen to rewrite the file."""
+        if not changes:
+            return False
+        if meta is None or meta.ilst_offset is None:
+            # Unknown layout or no ilst yet: mutagen has to insert atoms
+            return True
+
+        new_size = meta.ilst_size
+        for key, value in changes.items():
+            new_size -= meta.item_sizes.get(key, 0)
+            if value is not None:
+                new_size += TagEditor.item_size(key, value)
+        # mutagen always writes a free atom (8 byte header) after ilst
+        return new_size + 8 > meta.ilst_size + meta.padding_size
+
+    @staticmethod
+    def plan(book: Audiobook, series: Optional[str], index: Optional[str]) -> TagPlan:
+        """Diff a book against its file and predict the cost of writing it."""
+        return TagEditor.plan_file([(book, series, index)])
+
+    @staticmethod
+    def plan_file(entries) -> TagPlan:
+        """Plan several payload entries for the same file as if applied in order.
+
+        The result is a single merged diff, so the file is written only once.
+        """
+        path = entries[0][0].path
+        meta = read_metadata(path)
+        original = meta.tags if meta is not None else tags_from_mutagen(MP4(path).tags)
+        current = dict(original)
+
+        changes = {}
+        for book, series, index in entries:
+            step = TagEditor.diff_tags(current, TagEditor.desired_tags(book, series, index))
+            for key, value in step.items():
+                changes[key] = value
+                if value is None:
+                    current.pop(key, None)
+                else:
+                    current[key] = value
+
+        plan = TagPlan(list(entries), changes, {key: original.get(key) for key in changes})
+        plan.rewrite = TagEditor.needs_rewrite(meta, changes)
+        if plan.rewrite:
+            if meta is not None:
+                plan.rewrite_bytes = meta.file_size - (meta.ilst_offset or 0)
+            else:
+                plan.rewrite_bytes = os.path.getsize(path)
+        return plan
+
+    @staticmethod
+    def padding(info) -> int:
+        """mutagen padding callback: stay in place when possible, reserve room on rewrites."""
+        if info.padding >= 0:
+            # Never shrink existing padding; that would also force a rewrite
+            return info.padding
+        return REWRITE_PADDING
+
+    @staticmethod
+    def write(path, changes: Dict[str, Optional[list]]):
+        audio = MP4(path)
+        TagEditor.apply_changes(audio, changes)
+        audio.save(padding=TagEditor.padding)
+
+
+def _transient(error: Exception) -> bool:
+    """I/O errors (e.g. a NAS dropping out) are worth retrying; mutagen wraps them."""
+    return isinstance(error, OSError) or bool(error.args) and isinstance(error.args[0], OSError)
+
+
+class TagJob:
+    """Syncs a payload of (book, series, index) entries to their files.
+
+    Shared by TagWorker and the CLI; progress is reported through the on_*
+    callbacks, which are called from the thread running run().
+
+    With a journal the job is recorded as it goes and can be resumed later:
+    pass the id and the paths TagJournal.resume() returned as journal_id/done.
+    """
+
+    # Seconds before the first retry of a failed read/write; doubled per retry
+    RETRY_DELAY = 2.0
+
+    def __init__(self, payload, rewrite_budget=None, writers=1, metrics=None, journal=None,
+                 journal_id=None, done=(), retries=3):
+        self.payload = payload
+        # Max bytes full-file rewrites may move in this job; None means unlimited
+        self.rewrite_budget = rewrite_budget
+        self.writers = max(1, int(writers))
+        self.cancel_event = threading.Event()
+        self.counts = {"changed": 0, "skipped": 0, "failed": 0, "deferred": 0, "cancelled": 0}
+        self.metrics = metrics if metrics is not None else JobMetrics("tag")
+        # TagJournal that gets every file's original tags before it is saved
+        self.journal = journal
+        self.journal_id = journal_id
+        # Paths a resumed job finished before
+        self.done = set(done)
+        self.retries = max(0, int(retries))
+        # (path, state) updates for the journal, committed in batches
+        self.journal_states = []
+
+        self.on_status = lambda message: None
+        self.on_progress = lambda percent: None
+        self.on_item = lambda book, status: None
+        self.on_rewrites_planned = lambda count, size: None
+
+    def cancel(self):
+        """Stop after the files currently being written; the rest is reported as cancelled."""
+        self.cancel_event.set()
+
+    def report(self, entries, status):
+        self.counts[status] += 1
+        self.metrics.count(status)
+        if status in ("skipped", "deferred", "failed"):
+            self.journal_states.append((entries[0][0].path, status))
+        for book, _, _ in entries:
+            self.on_item(book, status)
+
+    def checkpoint(self):
+        """Commit the buffered file states (writes commit their own)."""
+        if self.journal is not None and self.journal_states:
+            states, self.journal_states = self.journal_states, []
+            try:
+                self.journal.set_states(self.journal_id, states)
+            except Exception as e:
+                print(f"Failed to update the tag journal: {e}")
+
+    def retrying(self, action, *args):
+        """Run action, retrying transient I/O errors with exponential backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                return action(*args)
+            except Exception as e:
+                if attempt == self.retries or not _transient(e):
+                    raise
+                print(f"Retrying after error: {e}")
+                self.metrics.count("retry")
+                # Cancelling also ends the wait
+                if self.cancel_event.wait(self.RETRY_DELAY * 2 ** attempt):
+                    raise
+
+    def run(self) -> list:
+        """Plan and write the payload. Returns the entries deferred by the rewrite budget."""
+        # Entries for the same file are planned together in payload order and
+        # written by a single writer, so one file is never written concurrently
+        groups = {}
+        for entry in self.payload:
+            if entry[0].path not in self.done:
+                groups.setdefault(entry[0].path, []).append(entry)
+        groups = list(groups.values())
+        total = len(groups)
+
+        deferred = []
+        if self.journal is not None and self.journal_id is None:
+            self.journal_id = self.journal.begin(f"Tag {total} files", self.payload)
+        executor = ThreadPoolExecutor(max_workers=self.writers)
+        try:
+            # 1. Plan: header-only reads, so files already in sync are never rewritten
+            self.on_status(f"Checking tags of {total} files...")
+            plan_start = time.perf_counter()
+            plans = [None] * total
+            futures = {executor.submit(self.plan_group, entries): i for i, entries in enumerate(groups)}
+            for done, future in enumerate(as_completed(futures), 1):
+                self.on_progress(int((done / total) * 50))
+                i = futures[future]
+                result = future.result()
+                if isinstance(result, str):
+                    self.report(groups[i], result)
+                else:
+                    plans[i] = result
+
+            self.metrics.add_phase("plan", time.perf_counter() - plan_start)
+            self.checkpoint()
+
+            plans = [p for p in plans if p is not None]
+            rewrites = [p for p in plans if p.rewrite]
+            self.on_rewrites_planned(len(rewrites), sum(p.rewrite_bytes for p in rewrites))
+
+            # 2. Write, deferring rewrites once the budget is used up
+            write_start = time.perf_counter()
+            budget = self.rewrite_budget
+            futures = {}
+            for plan in plans:
+                if not plan.changes:
+                    self.report(plan.entries, "skipped")
+                    continue
+
+                if plan.rewrite and budget is not None:
+                    if plan.rewrite_bytes > budget:
+                        deferred.extend(plan.entries)
+                        self.report(plan.entries, "deferred")
+                        continue
+                    budget -= plan.rewrite_bytes
+
+                futures[executor.submit(self.write_plan, plan)] = plan
+            self.checkpoint()
+
+            for done, future in enumerate(as_completed(futures), 1):
+                plan = futures[future]
+                self.report(plan.entries, future.result())
+                self.on_progress(50 + int((done / len(futures)) * 50))
+                self.on_status(f"Applying ABS metadata: {done} of {len(futures)} files")
+            self.metrics.add_phase("write", time.perf_counter() - write_start)
+        finally:
+            executor.shutdown(wait=True)
+            self.metrics.finish()
+            self.checkpoint()
+            if self.journal is not None:
+                try:
+                    self.journal.finish(self.journal_id, "cancelled" if self.cancel_event.is_set() else "finished")
+                except Exception as e:
+                    print(f"Failed to update the tag journal: {e}")
+
+        self.on_progress(100)
+        return deferred
+
+    def plan_group(self, entries):
+        # Runs on a writer thread; returns a TagPlan or a status for report()
+        if self.cancel_event.is_set():
+            return "cancelled"
+        try:
+            return self.retrying(TagEditor.plan_file, entries)
+        except Exception as e:
+            print(f"Failed to read {entries[0][0].filename}: {e}")
+            return "failed"
+
+    def write_plan(self, plan):
+        # Runs on a writer thread; cancellation takes effect between files
+        if self.cancel_event.is_set():
+            return "cancelled"
+        path = plan.book.path
+        try:
+            if self.journal is not None:
+                self.journal.record(self.journal_id, path, plan.original, plan.changes)
+            start = time.perf_counter()
+            self.retrying(TagEditor.write, path, plan.changes)
+            self.metrics.record_file(path, time.perf_counter() - start)
+            self.metrics.count("rewrite" if plan.rewrite else "in place")
+            status = "changed"
+        except Exception as e:
+            print(f"Failed to update {plan.book.filename}: {e}")
+            status = "failed"
+        if self.journal is not None:
+            try:
+                self.journal.set_state(self.journal_id, path, "written" if status == "changed" else "failed")
+            except Exception as e:
+                print(f"Failed to update the tag journal for {plan.book.filename}: {e}")
+        return status
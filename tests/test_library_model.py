@@ -0,0 +1,45 @@
+from PyQt6.QtCore import QModelIndex, Qt
+
+from models import Audiobook
+from ui.library_model import LibraryFilterProxy, LibraryModel, STANDALONE
+
+
+def book(title, series, index):
+    return Audiobook(f"/lib/{series}/{title}.m4b", title, "Author", series, index, "JSON")
+
+
+def sorted_proxy(library_data, column, order=Qt.SortOrder.AscendingOrder):
+    model = LibraryModel(columns=("title", "index"))
+    model.set_library(library_data)
+    proxy = LibraryFilterProxy()
+    proxy.setSourceModel(model)
+    proxy.setSortRole(LibraryModel.SortRole)
+    proxy.sort(column, order)
+    return model, proxy
+
+
+def child_texts(proxy, parent, column=0):
+    if proxy.canFetchMore(parent):
+        proxy.fetchMore(parent)
+    return [proxy.index(row, column, parent).data() for row in range(proxy.rowCount(parent))]
+
+
+def test_index_column_sorts_numerically(qapp):
+    books = [book("A", "Saga", "10"), book("B", "Saga", "2"), book("C", "Saga", None), book("D", "Saga", "1.5")]
+    model, proxy = sorted_proxy({"Author": {"Saga": books}}, 1)
+    author = proxy.index(0, 0, QModelIndex())
+    series = proxy.index(0, 0, author)
+    assert child_texts(proxy, series, 1) == ["1.5", "2", "10", ""]
+
+    proxy.sort(1, Qt.SortOrder.DescendingOrder)
+    series = proxy.index(0, 0, proxy.index(0, 0, QModelIndex()))
+    assert child_texts(proxy, series, 1) == ["", "10", "2", "1.5"]
+
+
+def test_standalone_books_sort_last(qapp):
+    library = {"Author": {STANDALONE: [book("S", STANDALONE, None)],
+                          "Zeta": [book("Z", "Zeta", "1")],
+                          "Alpha": [book("A", "Alpha", "1")]}}
+    model, proxy = sorted_proxy(library, 0)
+    author = proxy.index(0, 0, QModelIndex())
+    assert child_texts(proxy, author) == ["Alpha", "Zeta", STANDALONE]
@@ -0,0 +1,12 @@
+from models import Audiobook
+from search import SearchIndex
+
+
+def test_single_letters_must_match_too():
+    index = SearchIndex()
+    index.add(Audiobook("/lib/a.m4b", "The Hobbit", "J. R. R. Tolkien", None, None, "JSON"))
+    index.add(Audiobook("/lib/b.m4b", "Unfinished Tales", "Christopher Tolkien", None, None, "JSON"))
+    assert index.search("tolkien") == {"/lib/a.m4b", "/lib/b.m4b"}
+    assert index.search("tolkien j") == {"/lib/a.m4b"}
+    assert index.search("tolkien x") == set()
+    assert index.search("j") == {"/lib/a.m4b"}
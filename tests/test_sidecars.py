@@ -0,0 +1,10 @@
+from models import Audiobook
+from sidecars import sidecar_data
+
+
+def test_index_from_file_name_is_not_written():
+    guessed = Audiobook("/lib/Saga/03 - Book.m4b", "Book", "Author", "Saga", "3", "JSON (File #)")
+    assert sidecar_data(guessed, {"series": ["Saga"]})["series"] == ["Saga"]
+
+    known = Audiobook("/lib/Saga/03 - Book.m4b", "Book", "Author", "Saga", "3", "JSON")
+    assert sidecar_data(known, {"series": ["Saga"]})["series"] == ["Saga #3"]
@@ -0,0 +1,21 @@
+from benchmark import write_mp4
+from models import Audiobook
+from mp4meta import read_metadata
+from tagger import TagEditor
+
+
+def test_plan_file_falls_back_to_mutagen(tmp_path):
+    path = tmp_path / "book.m4b"
+    write_mp4(path, {"\xa9nam": "Old Title", "----:com.apple.iTunes:X": "v"})
+    # Rename the freeform item's mean atom: mutagen reads it by position,
+    # the header-only reader gives up on the file
+    data = path.read_bytes()
+    mean = data.index(b"mean", data.index(b"----"))
+    path.write_bytes(data[:mean] + b"meen" + data[mean + 4:])
+    assert read_metadata(path) is None
+
+    book = Audiobook(path, "New Title", "Author", "Saga", "2", "JSON")
+    plan = TagEditor.plan(book, "Saga", "2")
+    assert plan.changes["\xa9nam"] == ["New Title"]
+    assert plan.rewrite
+    assert plan.rewrite_bytes == path.stat().st_size
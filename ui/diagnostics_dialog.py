@@ -0,0 +1,24 @@
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QPlainTextEdit, QDialogButtonBox
+from PyQt6.QtGui import QFont
+
+
+class DiagnosticsDialog(QDialog):
+    """Shows the timing report of the last scan and the last tag job."""
+
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Timing Diagnostics")
+        self.resize(800, 600)
+
+        layout = QVBoxLayout(self)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("monospace", 9))
+        reports = [metrics.report() for metrics in jobs if metrics is not None]
+        self.text.setPlainText(("\n\n" + "-" * 60 + "\n\n").join(reports) or "No scan or tag job has run yet.")
+        layout.addWidget(self.text)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
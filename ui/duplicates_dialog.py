@@ -0,0 +1,93 @@
+import os
+
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTreeWidget, QTreeWidgetItem, QPushButton, QLabel, QFileDialog
+)
+from PyQt6.QtCore import Qt, QUrl, pyqtSignal
+from PyQt6.QtGui import QDesktopServices
+
+from duplicates import KIND_LABELS
+
+
+class DuplicatesDialog(QDialog):
+    """Lists groups of likely duplicate books and lets the user pick some of them."""
+
+    # Books to add to the library selection
+    select_requested = pyqtSignal(list)
+
+    def __init__(self, groups, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Duplicate Books")
+        self.resize(1000, 600)
+        self.groups = groups
+
+        layout = QVBoxLayout(self)
+        copies = sum(len(group.books) for group in groups)
+        layout.addWidget(QLabel(f"{len(groups)} groups, {copies} files. "
+                                "Files in one group share an ISBN/ASIN, author + title, or audio."))
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Match / File", "Author", "Title", "Folder"])
+        self.tree.setSelectionMode(QTreeWidget.SelectionMode.ExtendedSelection)
+        for group in groups:
+            matched = ", ".join(KIND_LABELS[kind] for kind in group.kinds)
+            parent_item = QTreeWidgetItem([f"{matched}: {group.key}", "", "", ""])
+            parent_item.setFirstColumnSpanned(True)
+            for book in group.books:
+                item = QTreeWidgetItem([book.filename, book.author or "", book.title or "",
+                                        os.path.dirname(book.path)])
+                item.setData(0, Qt.ItemDataRole.UserRole, book)
+                parent_item.addChild(item)
+            self.tree.addTopLevelItem(parent_item)
+        self.tree.expandAll()
+        for column in range(3):
+            self.tree.resizeColumnToContents(column)
+        self.tree.itemDoubleClicked.connect(lambda item: self.open_folder(item))
+        layout.addWidget(self.tree)
+
+        buttons = QHBoxLayout()
+        for text, slot in (("Select in Library", self.select_in_library),
+                           ("Open Folder", lambda: self.open_folder(self.tree.currentItem())),
+                           ("Export...", self.export)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        buttons.addStretch()
+        close = QPushButton("Close")
+        close.clicked.connect(self.accept)
+        buttons.addWidget(close)
+        layout.addLayout(buttons)
+
+    def selected_books(self):
+        """Books of the selected rows; a selected group row stands for all its files."""
+        books = {}
+        for item in self.tree.selectedItems():
+            children = [item.child(i) for i in range(item.childCount())] or [item]
+            for child in children:
+                book = child.data(0, Qt.ItemDataRole.UserRole)
+                books[book.path] = book
+        return list(books.values())
+
+    def select_in_library(self):
+        books = self.selected_books()
+        if books:
+            self.select_requested.emit(books)
+
+    def open_folder(self, item):
+        book = item.data(0, Qt.ItemDataRole.UserRole) if item else None
+        if book:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(book.path)))
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Duplicates", "duplicates.txt", "Text files (*.txt)")
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for group in self.groups:
+                    f.write(f"{', '.join(KIND_LABELS[kind] for kind in group.kinds)}: {group.key}\n")
+                    for book in group.books:
+                        f.write(f"    {book.path}\n")
+                    f.write("\n")
+        except OSError as e:
+            print(f"Error exporting duplicates to {path}: {e}")
@@ -0,0 +1,107 @@
+import time
+
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTreeWidget, QTreeWidgetItem, QPushButton, QLabel, QSplitter, QCheckBox
+)
+from PyQt6.QtCore import Qt, pyqtSignal
+
+
+class JournalDialog(QDialog):
+    """Lists journaled tag jobs and their files so they can be rolled back or resumed."""
+
+    # (job id, paths or None for the whole job, force)
+    rollback_requested = pyqtSignal(int, object, bool)
+    # Job id of an unfinished job to continue
+    resume_requested = pyqtSignal(int)
+
+    def __init__(self, journal, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Undo or Resume Tag Jobs")
+        self.resize(1000, 650)
+        self.journal = journal
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Rolling back restores the tags a job replaced. Files changed again "
+                                "since are skipped unless overwriting is allowed.\n"
+                                "Resuming continues an interrupted job, retrying files that failed."))
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        self.jobs = QTreeWidget()
+        self.jobs.setHeaderLabels(["Job", "Started", "Description", "Status", "Files"])
+        self.jobs.setRootIsDecorated(False)
+        for job in journal.jobs():
+            states = ", ".join(f"{count} {state}" for state, count in sorted(job["states"].items()))
+            status = "interrupted" if job["status"] == "running" else job["status"]
+            item = QTreeWidgetItem([str(job["id"]), time.strftime("%Y-%m-%d %H:%M", time.localtime(job["started"])),
+                                    job["description"] or "", status or "", states or "nothing written"])
+            item.setData(0, Qt.ItemDataRole.UserRole, job["id"])
+            item.setData(1, Qt.ItemDataRole.UserRole, job["resumable"])
+            self.jobs.addTopLevelItem(item)
+        for column in range(4):
+            self.jobs.resizeColumnToContents(column)
+        self.jobs.currentItemChanged.connect(self.show_files)
+        splitter.addWidget(self.jobs)
+
+        self.files = QTreeWidget()
+        self.files.setHeaderLabels(["File", "State", "Tags"])
+        self.files.setRootIsDecorated(False)
+        self.files.setSelectionMode(QTreeWidget.SelectionMode.ExtendedSelection)
+        splitter.addWidget(self.files)
+        layout.addWidget(splitter)
+
+        self.force = QCheckBox("Overwrite files whose tags changed after the job")
+        layout.addWidget(self.force)
+
+        buttons = QHBoxLayout()
+        self.btn_job = QPushButton("Roll Back Job")
+        self.btn_job.clicked.connect(self.rollback_job)
+        buttons.addWidget(self.btn_job)
+        self.btn_files = QPushButton("Roll Back Selected Files")
+        self.btn_files.clicked.connect(self.rollback_files)
+        buttons.addWidget(self.btn_files)
+        self.btn_resume = QPushButton("Resume Job")
+        self.btn_resume.clicked.connect(self.resume_job)
+        buttons.addWidget(self.btn_resume)
+        buttons.addStretch()
+        close = QPushButton("Close")
+        close.clicked.connect(self.reject)
+        buttons.addWidget(close)
+        layout.addLayout(buttons)
+
+        if self.jobs.topLevelItemCount():
+            self.jobs.setCurrentItem(self.jobs.topLevelItem(0))
+
+    def current_job(self):
+        item = self.jobs.currentItem()
+        return item.data(0, Qt.ItemDataRole.UserRole) if item else None
+
+    def show_files(self):
+        self.files.clear()
+        job = self.current_job()
+        item = self.jobs.currentItem()
+        self.btn_resume.setEnabled(bool(item and item.data(1, Qt.ItemDataRole.UserRole)))
+        if job is None:
+            return
+        for entry in self.journal.entries(job):
+            item = QTreeWidgetItem([entry["path"], entry["state"], ", ".join(sorted(entry["written"]))])
+            self.files.addTopLevelItem(item)
+        self.files.resizeColumnToContents(1)
+
+    def rollback_job(self):
+        job = self.current_job()
+        if job is not None:
+            self.rollback_requested.emit(job, None, self.force.isChecked())
+            self.accept()
+
+    def resume_job(self):
+        job = self.current_job()
+        if job is not None:
+            self.resume_requested.emit(job)
+            self.accept()
+
+    def rollback_files(self):
+        job = self.current_job()
+        paths = [item.text(0) for item in self.files.selectedItems()]
+        if job is not None and paths:
+            self.rollback_requested.emit(job, paths, self.force.isChecked())
+            self.accept()
@@ -1,11 +1,15 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QTextEdit, QFormLayout, QSpinBox, QPushButton, QMessageBox
-import json
+import os
+
+from scanner import load_sidecar
+from sidecars import write_json_atomic
 
 
 class JSONMetadataPanel(QWidget):
     def __init__(self):
         super().__init__()
         self.book = None
+        self.data = {}
         self._init_ui()
 
     def _init_ui(self):
@@ -41,7 +45,8 @@ class JSONMetadataPanel(QWidget):
 
     def load_book(self, book):
         self.book = book
-        data = getattr(book, "json_data", {})  # stored JSON
+        # Books do not keep their sidecar, so read it again
+        data = self.data = load_sidecar(os.path.dirname(book.path)) or {}
 
         def first_or_default(val, default=""):
             if isinstance(val, list):
@@ -62,11 +67,11 @@ class JSONMetadataPanel(QWidget):
         self.description.setPlainText(first_or_default(data.get("description"), ""))
 
     def apply_changes(self):
-        if not self.book or not self.book.json_data:
+        if not self.book or not self.data:
             QMessageBox.warning(self, "No JSON", "No JSON metadata available to update.")
             return
 
-        data = self.book.json_data
+        data = self.data
         data["title"] = self.title.text()
         data["authors"] = [self.author.text()]
         data["series"] = [self.series.text()]
@@ -78,9 +83,8 @@ class JSONMetadataPanel(QWidget):
 
         # Save back to JSON file
         try:
-            json_file = self.book.path.parent / "metadata.json"
-            with open(json_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            json_file = os.path.join(os.path.dirname(self.book.path), "metadata.json")
+            write_json_atomic(json_file, data)
             QMessageBox.information(self, "Success", "JSON metadata updated successfully!")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save JSON: {e}")
\ No newline at end of file
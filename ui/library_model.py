@@ -0,0 +1,573 @@
+import bisect
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from PyQt6.QtCore import Qt, QAbstractItemModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor, QFont, QIcon, QPixmap
+
+from models import Audiobook
+from search import SearchIndex
+from series import index_sort_key
+
+
+STANDALONE = "Standalone Books"
+
+
+def series_sort_key(series: str):
+    return (series == STANDALONE, series)
+
+
+def book_sort_key(book: Audiobook):
+    return (index_sort_key(book.series_index), book.title)
+
+
+class _Root:
+    __slots__ = ("children",)
+
+    def __init__(self):
+        self.children: List["_Author"] = []
+
+
+class _Author:
+    __slots__ = ("name", "children")
+
+    def __init__(self, name):
+        self.name = name
+        self.children: List["_Series"] = []
+
+
+class _Series:
+    __slots__ = ("author", "name", "children", "fetched")
+
+    def __init__(self, author, name):
+        self.author = author
+        self.name = name
+        # Books, kept sorted; only the first `fetched` are exposed as rows
+        self.children: List[Audiobook] = []
+        self.fetched = 0
+
+
+class LibraryModel(QAbstractItemModel):
+    """Author > Series > Book model backed directly by the scanned Audiobook records.
+
+    Every index stores its *parent* node as internal pointer, so books need no
+    wrapper objects. Series children are exposed lazily through fetchMore.
+    """
+
+    FETCH_BATCH = 200
+    SortRole = Qt.ItemDataRole.UserRole + 1
+
+    COLUMNS = {
+        "title": "Title",
+        "series": "Series",
+        "index": "Index",
+        "author": "Author",
+        "year": "Year",
+        "narrators": "Narrators",
+        "isbn": "ISBN",
+        "asin": "ASIN",
+        "filename": "Filename",
+        "source": "Source",
+    }
+    DEFAULT_COLUMNS = ("title", "series", "index", "author", "year", "narrators", "isbn", "asin", "filename")
+
+    # Number of selected books
+    selection_changed = pyqtSignal(int)
+    # Path of a book whose row is painted and whose cover is not known yet;
+    # answer with set_cover()
+    cover_requested = pyqtSignal(str)
+    # Cover icons kept; others are requested again when painted
+    COVERS_KEPT = 5000
+
+    def __init__(self, columns=DEFAULT_COLUMNS, headers: Optional[Dict[str, str]] = None, parent=None):
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.headers = [(headers or {}).get(c, self.COLUMNS[c]) for c in self.columns]
+        self.icons = {}
+        self.show_covers = False
+
+        self._root = _Root()
+        self._authors: Dict[str, _Author] = {}
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._book_series: Dict[str, _Series] = {}
+        self._books: Dict[str, Audiobook] = {}
+        # path -> (text, color) shown in the "index" column after tagging
+        self._status: Dict[object, Tuple[str, str]] = {}
+        # Paths of the selected books, shown bold; kept across re-parses of a file
+        self._selected: Set[str] = set()
+        # path -> cover icon, None for books without cover
+        self._covers: "OrderedDict[str, Optional[QIcon]]" = OrderedDict()
+        self._covers_requested: Set[str] = set()
+        self.search_index = SearchIndex()
+
+        self._author_font = QFont()
+        self._author_font.setBold(True)
+        self._author_font.setPointSize(11)
+        self._bold_font = QFont()
+        self._bold_font.setBold(True)
+        self._series_brush = QBrush(QColor("#88c0d0"))
+
+    # ----- structure -----
+
+    def _node(self, index: QModelIndex):
+        parent = index.internalPointer()
+        return parent.children[index.row()]
+
+    def index(self, row, column, parent=QModelIndex()):
+        # Bounds checked here instead of hasIndex(): proxies call this once per row
+        if row < 0 or not 0 <= column < len(self.columns):
+            return QModelIndex()
+        if not parent.isValid():
+            node = self._root
+            rows = len(node.children)
+        elif parent.column() != 0:
+            return QModelIndex()
+        else:
+            node = self._node(parent)
+            if isinstance(node, _Author):
+                rows = len(node.children)
+            elif isinstance(node, _Series):
+                rows = node.fetched
+            else:
+                return QModelIndex()
+        return self.createIndex(row, column, node) if row < rows else QModelIndex()
+
+    def parent(self, index=QModelIndex()):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer()
+        if isinstance(parent, _Author):
+            row = bisect.bisect_left(self._root.children, parent.name, key=lambda a: a.name)
+            return self.createIndex(row, 0, self._root)
+        if isinstance(parent, _Series):
+            author = parent.author
+            row = bisect.bisect_left(author.children, series_sort_key(parent.name),
+                                     key=lambda s: series_sort_key(s.name))
+            return self.createIndex(row, 0, author)
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._root.children)
+        if parent.column() != 0:
+            return 0
+        node = self._node(parent)
+        if isinstance(node, _Author):
+            return len(node.children)
+        if isinstance(node, _Series):
+            return node.fetched
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.columns)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self._root.children)
+        if parent.column() != 0:
+            return False
+        node = self._node(parent)
+        return isinstance(node, (_Author, _Series)) and bool(node.children)
+
+    def canFetchMore(self, parent):
+        if not parent.isValid():
+            return False
+        node = self._node(parent)
+        return isinstance(node, _Series) and node.fetched < len(node.children)
+
+    def fetchMore(self, parent):
+        if not parent.isValid():
+            return
+        node = self._node(parent)
+        if not isinstance(node, _Series):
+            return
+        count = min(self.FETCH_BATCH, len(node.children) - node.fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, node.fetched, node.fetched + count - 1)
+        node.fetched += count
+        self.endInsertRows()
+
+    # ----- data -----
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def book_text(self, book: Audiobook, column: str) -> str:
+        if column == "title":
+            return book.title
+        if column == "series":
+            return f"{book.series} #{book.series_index}" if book.series_index else book.series
+        if column == "index":
+            return str(book.series_index) if book.series_index else ""
+        if column == "author":
+            return book.author or ""
+        if column == "year":
+            return str(book.year) if book.year else ""
+        if column == "filename":
+            return book.filename or ""
+        return getattr(book, column, "") or ""
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = self._node(index)
+        column = self.columns[index.column()]
+
+        if isinstance(node, Audiobook):
+            if role == Qt.ItemDataRole.UserRole:
+                return node
+            status = self._status.get(node.path) if column == "index" else None
+            if role == Qt.ItemDataRole.DisplayRole:
+                return status[0] if status else self.book_text(node, column)
+            if role == self.SortRole:
+                # Scalars only: the proxy compares tuples as strings. Ties keep
+                # the model's order, which is book_sort_key's.
+                if column == "index":
+                    return index_sort_key(node.series_index)
+                return self.book_text(node, column).lower()
+            if role == Qt.ItemDataRole.ForegroundRole and status:
+                return QBrush(QColor(status[1]))
+            if role == Qt.ItemDataRole.FontRole and index.column() == 0 and node.path in self._selected:
+                return self._bold_font
+            if role == Qt.ItemDataRole.DecorationRole and index.column() == 0:
+                return self.cover_icon(node.path) or self.icons.get("BOOK")
+            return None
+
+        kind = "AUTHOR" if isinstance(node, _Author) else "SERIES"
+        if role == Qt.ItemDataRole.UserRole:
+            return kind
+        if index.column() != 0:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return node.name
+        if role == self.SortRole:
+            if kind == "SERIES":
+                # series_sort_key as a string: Standalone Books last
+                return ("1" if node.name == STANDALONE else "0") + node.name
+            return node.name
+        if role == Qt.ItemDataRole.FontRole and kind == "AUTHOR":
+            return self._author_font
+        if role == Qt.ItemDataRole.ForegroundRole and kind == "SERIES":
+            return self._series_brush
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.icons.get(kind)
+        return None
+
+    # ----- population -----
+
+    def clear(self):
+        self.beginResetModel()
+        self._root = _Root()
+        self._authors.clear()
+        self._series.clear()
+        self._book_series.clear()
+        self._books.clear()
+        self._status.clear()
+        self._selected.clear()
+        self._covers.clear()
+        self._covers_requested.clear()
+        self.search_index.clear()
+        self.endResetModel()
+        self.selection_changed.emit(0)
+
+    def set_library(self, library_data):
+        """Replace the model contents with an author -> series -> [Audiobook] dict."""
+        self.beginResetModel()
+        self._root = _Root()
+        self._authors.clear()
+        self._series.clear()
+        self._book_series.clear()
+        self._books.clear()
+        self._status.clear()
+        self._selected.clear()
+        self.search_index.clear()
+
+        for author_name in sorted(library_data.keys()):
+            author = _Author(author_name)
+            self._root.children.append(author)
+            self._authors[author_name] = author
+            for series_name in sorted(library_data[author_name].keys(), key=series_sort_key):
+                series = _Series(author, series_name)
+                series.children = sorted(library_data[author_name][series_name], key=book_sort_key)
+                author.children.append(series)
+                self._series[(author_name, series_name)] = series
+                for book in series.children:
+                    self._book_series[book.path] = series
+                    self._books[book.path] = book
+                    self.search_index.add(book)
+        self.endResetModel()
+        self.selection_changed.emit(0)
+
+    def add_books(self, books):
+        """Insert books under their author/series nodes, keeping every level sorted."""
+        for book in books:
+            series = self._get_series(book.author, book.series if book.series else STANDALONE)
+            pos = bisect.bisect_right(series.children, book_sort_key(book), key=book_sort_key)
+
+            # Rows are only announced for loaded parts of a series; a series the
+            # view never expanded stays lazy until fetchMore.
+            visible = pos < series.fetched or (series.fetched and series.fetched == len(series.children))
+            if visible:
+                self.beginInsertRows(self.series_index(series), pos, pos)
+            series.children.insert(pos, book)
+            self._book_series[book.path] = series
+            self._books[book.path] = book
+            self.search_index.add(book)
+            if visible:
+                series.fetched += 1
+                self.endInsertRows()
+
+    def remove_books(self, paths):
+        """Remove the books with these paths, dropping series and authors left empty."""
+        selected = len(self._selected)
+        for path in paths:
+            book = self.book_at(path)
+            if book is not None:
+                self._take_book(book)
+                self.search_index.remove(path)
+                self._status.pop(path, None)
+                self._selected.discard(path)
+        if len(self._selected) != selected:
+            self.selection_changed.emit(len(self._selected))
+
+    def update_books(self, books):
+        """Replace books by path with re-parsed records, moving them to their new author/series."""
+        for book in books:
+            old = self.book_at(book.path)
+            if old is not None:
+                self._take_book(old)
+        self.add_books(books)
+
+    def book_at(self, path) -> Optional[Audiobook]:
+        """The book currently shown for a path, loaded or not."""
+        return self._books.get(path)
+
+    def _take_book(self, book: Audiobook):
+        series = self._book_series.pop(book.path)
+        del self._books[book.path]
+        # A re-parsed file may have a new cover
+        self._covers.pop(book.path, None)
+        row = bisect.bisect_left(series.children, book_sort_key(book), key=book_sort_key)
+        while series.children[row] is not book:
+            row += 1
+
+        visible = row < series.fetched
+        if visible:
+            self.beginRemoveRows(self.series_index(series), row, row)
+        del series.children[row]
+        if visible:
+            series.fetched -= 1
+            self.endRemoveRows()
+
+        if series.children:
+            return
+        author = series.author
+        row = self.series_index(series).row()
+        self.beginRemoveRows(self.node_index(author), row, row)
+        del author.children[row]
+        del self._series[(author.name, series.name)]
+        self.endRemoveRows()
+
+        if author.children:
+            return
+        row = self.node_index(author).row()
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._root.children[row]
+        del self._authors[author.name]
+        self.endRemoveRows()
+
+    def fetch_series(self, series: _Series):
+        """Expose every book of a series as rows (e.g. so search hits are visible)."""
+        if series.fetched < len(series.children):
+            self.beginInsertRows(self.series_index(series), series.fetched, len(series.children) - 1)
+            series.fetched = len(series.children)
+            self.endInsertRows()
+
+    def _get_series(self, author_name, series_name) -> _Series:
+        series = self._series.get((author_name, series_name))
+        if series:
+            return series
+
+        author = self._authors.get(author_name)
+        if author is None:
+            author = _Author(author_name)
+            pos = bisect.bisect_right(self._root.children, author_name, key=lambda a: a.name)
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self._root.children.insert(pos, author)
+            self._authors[author_name] = author
+            self.endInsertRows()
+
+        series = _Series(author, series_name)
+        key = series_sort_key(series_name)
+        pos = bisect.bisect_right(author.children, key, key=lambda s: series_sort_key(s.name))
+        self.beginInsertRows(self.node_index(author), pos, pos)
+        author.children.insert(pos, series)
+        self._series[(author_name, series_name)] = series
+        self.endInsertRows()
+        return series
+
+    # ----- lookups -----
+
+    def node_index(self, author: _Author) -> QModelIndex:
+        row = bisect.bisect_left(self._root.children, author.name, key=lambda a: a.name)
+        return self.createIndex(row, 0, self._root)
+
+    def series_index(self, series: _Series) -> QModelIndex:
+        row = bisect.bisect_left(series.author.children, series_sort_key(series.name),
+                                 key=lambda s: series_sort_key(s.name))
+        return self.createIndex(row, 0, series.author)
+
+    def book_index(self, book: Audiobook, column=0) -> QModelIndex:
+        """Index of a loaded book row, or an invalid index if it is not loaded."""
+        series = self._book_series.get(book.path)
+        if series is None:
+            return QModelIndex()
+        key = book_sort_key(book)
+        row = bisect.bisect_left(series.children, key, key=book_sort_key)
+        while row < len(series.children) and series.children[row] is not book:
+            row += 1
+        if row >= series.fetched:
+            return QModelIndex()
+        return self.createIndex(row, column, series)
+
+    def books_under(self, index: QModelIndex) -> List[Tuple[Audiobook, str]]:
+        """(book, series name) for every book below an index, loaded or not."""
+        if not index.isValid():
+            return []
+        node = self._node(index)
+        if isinstance(node, Audiobook):
+            return [(node, index.internalPointer().name)]
+        series_nodes = node.children if isinstance(node, _Author) else [node]
+        return [(book, series.name) for series in series_nodes for book in series.children]
+
+    def set_statuses(self, items):
+        """Apply many (path, text, color) statuses with one repaint per affected series."""
+        for path, text, color in items:
+            self._status[path] = (text, color)
+        if "index" in self.columns:
+            self._repaint({path for path, _, _ in items}, self.columns.index("index"),
+                          [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ForegroundRole])
+
+    def _repaint(self, paths, column, roles):
+        """Emit dataChanged for one column of these books' loaded rows."""
+        series_nodes = {self._book_series[path] for path in paths if path in self._book_series}
+        if len(paths) < 20:
+            for path in paths:
+                book = self._books.get(path)
+                index = self.book_index(book, column) if book else QModelIndex()
+                if index.isValid():
+                    self.dataChanged.emit(index, index, roles)
+            return
+        for series in series_nodes:
+            if series.fetched:
+                parent = self.series_index(series)
+                self.dataChanged.emit(self.index(0, column, parent), self.index(series.fetched - 1, column, parent),
+                                      roles)
+
+    # ----- covers -----
+
+    def cover_icon(self, path) -> Optional[QIcon]:
+        if not self.show_covers:
+            return None
+        if path in self._covers:
+            self._covers.move_to_end(path)
+            return self._covers[path]
+        if path not in self._covers_requested:
+            self._covers_requested.add(path)
+            self.cover_requested.emit(path)
+        return None
+
+    def set_cover(self, path, image):
+        """Cover (a QImage, or None for none) of a book that cover_requested asked for."""
+        self._covers_requested.discard(path)
+        if path not in self._books:
+            return
+        self._covers[path] = QIcon(QPixmap.fromImage(image)) if image is not None else None
+        while len(self._covers) > self.COVERS_KEPT:
+            self._covers.popitem(last=False)
+        self._repaint([path], 0, [Qt.ItemDataRole.DecorationRole])
+
+    # ----- selection -----
+
+    def selected_count(self) -> int:
+        return len(self._selected)
+
+    def selected_books(self) -> List[Audiobook]:
+        """Selected books in path order (roughly on-disk order for the tag writer)."""
+        return [self._books[path] for path in sorted(self._selected)]
+
+    def set_selected(self, paths: Iterable[str], selected: bool = True):
+        """Select or deselect many books."""
+        paths = set(paths).intersection(self._books)
+        if selected:
+            changed = paths - self._selected
+            self._selected |= changed
+        else:
+            changed = paths & self._selected
+            self._selected -= changed
+        self._selection_repaint(changed)
+
+    def toggle_selected(self, path):
+        self.set_selected([path], path not in self._selected)
+
+    def select_all(self):
+        self.set_selected(self._books)
+
+    def clear_selection(self):
+        changed = self._selected
+        self._selected = set()
+        self._selection_repaint(changed)
+
+    def invert_selection(self):
+        changed = set(self._books)
+        self._selected = changed - self._selected
+        self._selection_repaint(changed)
+
+    def _selection_repaint(self, paths):
+        if paths:
+            # The font only changes in column 0
+            self._repaint(paths, 0, [Qt.ItemDataRole.FontRole])
+            self.selection_changed.emit(len(self._selected))
+
+
+class LibraryFilterProxy(QSortFilterProxyModel):
+    """Sort proxy that can also hide everything but a set of search hits.
+
+    The filter comes from LibraryModel.search_index, so changing it never
+    rebuilds the tree; authors and series are shown when they hold a hit.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.matches = None
+        self._series = set()
+        self._authors = set()
+
+    def set_matches(self, matches):
+        """Show only books whose path is in matches; None shows everything."""
+        model = self.sourceModel()
+        self.matches = matches
+        self._series = set()
+        self._authors = set()
+        if matches is not None:
+            for path in matches:
+                series = model._book_series.get(path)
+                if series is not None and series not in self._series:
+                    self._series.add(series)
+                    self._authors.add(series.author)
+                    model.fetch_series(series)
+        self.invalidateRowsFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.matches is None:
+            return True
+        model = self.sourceModel()
+        node = model._node(model.index(source_row, 0, source_parent))
+        if isinstance(node, Audiobook):
+            return node.path in self.matches
+        if isinstance(node, _Series):
+            return node in self._series
+        return node in self._authors
@@ -1,16 +1,27 @@
+from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QTextEdit, QFormLayout, QSpinBox, QPushButton, QMessageBox
-from mutagen.mp4 import MP4, MP4FreeForm
+
+from models import Audiobook
+from series import get_parser
 
 
 class M4BMetadataPanel(QWidget):
+    # [(book, series, index)] tag job payload with the edited values; the
+    # window runs it like any other sync (journal, in-place writes)
+    apply_requested = pyqtSignal(list)
+
     def __init__(self):
         super().__init__()
         self.book = None
+        self.details = None
         self._init_ui()
 
     def _init_ui(self):
         layout = QVBoxLayout(self)
 
+        self.state = QLabel("")
+        layout.addWidget(self.state)
+
         form_layout = QFormLayout()
 
         self.title = QLineEdit()
@@ -19,6 +30,8 @@ class M4BMetadataPanel(QWidget):
         self.narrators = QLineEdit()
         self.year = QSpinBox()
         self.year.setRange(0, 2100)
+        # 0 means no year; shown blank and not written
+        self.year.setSpecialValueText(" ")
         self.isbn = QLineEdit()
         self.asin = QLineEdit()
         self.description = QTextEdit()
@@ -39,9 +52,22 @@ class M4BMetadataPanel(QWidget):
         self.btn_apply.clicked.connect(self.apply_changes)
         layout.addWidget(self.btn_apply)
 
-    def load_book(self, book):
+    def load_book(self, book, details=None):
+        """Show book with the tags read from its file (a details.BookDetails).
+
+        Without details the scanned values are shown and applying is
+        disabled, since the file's other tags are not known yet.
+        """
         self.book = book
-        tags = getattr(book, "m4b_tags", {}) or {}
+        self.details = details
+        tags = details.tags if details is not None else {}
+        self.btn_apply.setEnabled(details is not None and details.error is None)
+        if details is None:
+            self.state.setText("Reading tags...")
+        elif details.error:
+            self.state.setText(f"Could not read tags: {details.error}")
+        else:
+            self.state.setText(f"{len(tags)} tags in file")
 
         def first_or_default(val, default=""):
             if isinstance(val, list):
@@ -76,28 +102,19 @@ class M4BMetadataPanel(QWidget):
             QMessageBox.warning(self, "No Book", "No book loaded to update.")
             return
 
-        try:
-            audio = MP4(self.book.path)
-
-            # Normal text tags (string lists)
-            def list_str(val):
-                return [str(val)] if val is not None else [""]
-
-            audio.tags["\xa9nam"] = list_str(self.title.text())
-            audio.tags["\xa9ART"] = list_str(self.author.text())
-            audio.tags["aART"] = list_str(self.author.text())
-            audio.tags["\xa9grp"] = list_str(self.series.text())
-            audio.tags["\xa9alb"] = list_str(self.series.text())
-            audio.tags["\xa9day"] = list_str(self.year.value())
-            audio.tags["\xa9cmt"] = list_str(self.description.toPlainText())
-
-            # Freeform tags need MP4FreeForm wrapper
-            audio.tags["----:com.apple.iTunes:Narrators"] = [MP4FreeForm(self.narrators.text())]
-            audio.tags["----:com.apple.iTunes:ISBN"] = [MP4FreeForm(self.isbn.text())]
-            audio.tags["----:com.apple.iTunes:ASIN"] = [MP4FreeForm(self.asin.text())]
-
-            audio.save()
-            QMessageBox.information(self, "Success", "M4B metadata updated successfully!")
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to save M4B tags: {e}")
\ No newline at end of file
+        # The series field holds the grouping tag as written ("Name #3");
+        # its index also goes into the disk number, as a sync would write it.
+        # Blank optional fields leave the file's tag alone.
+        series = self.series.text().strip() or None
+        name, index = get_parser().parse(series) if series else (None, None)
+        edited = Audiobook(
+            self.book.path, self.title.text(), self.author.text(), name, index, self.book.source,
+            narrators=self.narrators.text().strip() or None,
+            year=str(self.year.value()) if self.year.value() else None,
+            isbn=self.isbn.text().strip() or None,
+            asin=self.asin.text().strip() or None,
+            description=self.description.toPlainText() or None,
+        )
+        self.btn_apply.setEnabled(False)
+        self.state.setText("Writing tags...")
+        self.apply_requested.emit([(edited, series, index)])
\ No newline at end of file
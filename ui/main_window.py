@@ -1,17 +1,42 @@
+import os
+import re
 from typing import Optional, List
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QFileDialog, QTreeWidget, QTreeWidgetItem, QLabel, QHeaderView,
-    QProgressBar, QApplication, QGroupBox, QFormLayout, QMenu, QAction
+    QFileDialog, QTreeView, QLabel, QHeaderView,
+    QProgressBar, QApplication, QGroupBox, QFormLayout, QMenu, QInputDialog, QLineEdit
 )
-from PyQt6.QtCore import Qt, QSettings
-from PyQt6.QtGui import QBrush, QColor, QFont
+from PyQt6.QtCore import Qt, QSettings, QModelIndex, QPersistentModelIndex, QSize, QTimer
+from PyQt6.QtGui import QAction, QFont, QPixmap
 
+from covers import CoverCache
+from details import DetailCache
+from metrics import JobMetrics
 from models import Audiobook
-from workers import ScanWorker, TagWorker
+from scanner import LibraryScanner
+from watcher import LibraryWatcher
+from workers import (
+    CoverLoader, DetailLoader, DuplicateWorker, MismatchWorker, RollbackWorker, ScanWorker, SidecarWorker, TagWorker
+)
+from ui.library_model import LibraryModel, LibraryFilterProxy
+from ui.m4b_metadata_panel import M4BMetadataPanel
 
 
 class MainWindow(QMainWindow):
+    # Tag job status -> (text, color) shown in the index column
+    TAG_STATUSES = {
+        "changed": ("TAG UPDATED", "#a3be8c"),
+        "skipped": ("UP TO DATE", "#88c0d0"),
+        "deferred": ("DEFERRED", "#ebcb8b"),
+        "cancelled": ("CANCELLED", "#d08770"),
+        "failed": ("FAILED", "#bf616a"),
+        "rolled back": ("ROLLED BACK", "#b48ead"),
+    }
+    # Books above and below the current one whose tags are read ahead
+    PREFETCH_NEIGHBOURS = 3
+    # Cover icon size in the tree, in pixels
+    TREE_COVER_SIZE = 20
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Audiobook Metadata Manager")
@@ -21,12 +46,35 @@ class MainWindow(QMainWindow):
 
         self.library_data = {}
         self.scan_worker: Optional[ScanWorker] = None
+        self.watcher: Optional[LibraryWatcher] = None
+        self.library_root = None
         self.tag_worker: Optional[TagWorker] = None
-        self.book_item_map = {}
-        self.selected_books: List[QTreeWidgetItem] = []
+        self.duplicate_worker: Optional[DuplicateWorker] = None
+        self.mismatch_worker: Optional[MismatchWorker] = None
+        self.rollback_worker: Optional[RollbackWorker] = None
+        self.sidecar_worker: Optional[SidecarWorker] = None
+        # Last clicked book row, where shift-click ranges start
+        self.selection_anchor = QPersistentModelIndex()
+        self.deferred_payload = []
+        self.planned_rewrites = (0, 0)
+        self.last_scan_metrics: Optional[JobMetrics] = None
+        self.last_tag_metrics: Optional[JobMetrics] = None
+        # Book shown in the preview and file tag panel
+        self.current_book: Optional[Audiobook] = None
+
+        # Read file tags and covers off the GUI thread; run until the application quits
+        self.cover_cache = CoverCache(os.path.join(os.path.dirname(self.settings.fileName()), "covers"))
+        self.detail_cache = DetailCache()
+        self.detail_loader = DetailLoader(self.detail_cache, self.cover_cache)
+        self.detail_loader.details_loaded.connect(self.on_details_loaded)
+        self.cover_loader = CoverLoader(self.cover_cache, self.TREE_COVER_SIZE)
+        QApplication.instance().aboutToQuit.connect(self.stop_loaders)
+        self.detail_loader.start()
+        self.cover_loader.start()
 
         self._apply_theme()
         self._init_ui()
+        self.check_interrupted_jobs()
 
     def _apply_theme(self):
         font = QFont("Segoe UI", 10)
@@ -36,7 +84,7 @@ class MainWindow(QMainWindow):
 
         self.setStyleSheet("""
             QMainWindow, QWidget { background-color: #242424; color: #eeeeee; }
-            QTreeWidget {
+            QTreeView {
                 background-color: #2d2d2d;
                 color: #ffffff;
                 border: 1px solid #1b1b1b;
@@ -44,7 +92,7 @@ class MainWindow(QMainWindow):
                 selection-background-color: transparent;
                 selection-color: #ffffff;
             }
-            QTreeWidget::item { padding: 4px; border-bottom: 1px solid #282828; }
+            QTreeView::item { padding: 4px; border-bottom: 1px solid #282828; }
             QHeaderView::section {
                 background-color: #303030; color: #bbbbbb; padding: 6px; border: none; font-weight: bold;
             }
@@ -87,15 +135,47 @@ class MainWindow(QMainWindow):
         self.selected_count_label = QLabel("Selected books: 0")
         left_layout.addWidget(self.selected_count_label)
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["Title", "Series", "Index", "Author", "Year", "Narrators", "ISBN", "ASIN", "Filename"])
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search title, author, series, narrator, ISBN or ASIN...")
+        self.search_box.setClearButtonEnabled(True)
+        left_layout.addWidget(self.search_box)
+
+        # Coalesces keystrokes and library updates into one filter pass
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(100)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_box.textChanged.connect(self.search_timer.start)
+
+        self.model = LibraryModel()
+        self.model.selection_changed.connect(lambda count: self.selected_count_label.setText(f"Selected books: {count}"))
+        self.model.show_covers = self.settings.value("show_covers", True, type=bool)
+        # Covers are read only for rows being painted
+        self.model.cover_requested.connect(self.cover_loader.request)
+        self.cover_loader.cover_loaded.connect(self.model.set_cover)
+        self.proxy = LibraryFilterProxy()
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(LibraryModel.SortRole)
+        # Authors start expanded, as they are added
+        self.proxy.rowsInserted.connect(self.on_rows_inserted)
+        self.proxy.modelReset.connect(lambda: self.tree.expandToDepth(0))
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.proxy)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setIconSize(QSize(self.TREE_COVER_SIZE, self.TREE_COVER_SIZE))
         self.tree.setAlternatingRowColors(True)
-        self.tree.itemClicked.connect(self.on_item_click)
+        self.tree.clicked.connect(self.on_item_click)
+        # Follows arrow keys as well as clicks
+        self.tree.selectionModel().currentChanged.connect(self.on_current_changed)
         self.tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.tree.customContextMenuRequested.connect(self.open_context_menu)
 
         header = self.tree.header()
-        for i in range(self.tree.columnCount()):
+        # No sort column: keep the model's author/series/index order until a header is clicked
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.tree.setSortingEnabled(True)
+        for i in range(self.model.columnCount()):
             if i == 0:
                 header.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
             else:
@@ -107,6 +187,11 @@ class MainWindow(QMainWindow):
         self.btn_apply_tags.clicked.connect(self.apply_bulk_tags)
         left_layout.addWidget(self.btn_apply_tags)
 
+        self.btn_cancel = QPushButton("Cancel Tagging")
+        self.btn_cancel.setVisible(False)
+        self.btn_cancel.clicked.connect(self.cancel_tagging)
+        left_layout.addWidget(self.btn_cancel)
+
         main_layout.addWidget(left_widget, 3)
 
         # Right: Metadata preview
@@ -114,6 +199,11 @@ class MainWindow(QMainWindow):
         preview_layout = QFormLayout()
         self.preview_group.setLayout(preview_layout)
 
+        self.preview_cover = QLabel()
+        self.preview_cover.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.preview_cover.setFixedHeight(160)
+        preview_layout.addRow(self.preview_cover)
+
         self.preview_labels = {}
         for field in ["Title", "Series", "Index", "Author", "Year", "Narrators", "ISBN", "ASIN", "Filename"]:
             label = QLabel("")
@@ -121,100 +211,449 @@ class MainWindow(QMainWindow):
             self.preview_labels[field] = label
             preview_layout.addRow(f"{field}:", label)
 
-        main_layout.addWidget(self.preview_group, 2)
+        right_layout = QVBoxLayout()
+        right_layout.addWidget(self.preview_group)
+        self.file_tags_group = QGroupBox("File Tags")
+        file_tags_layout = QVBoxLayout(self.file_tags_group)
+        self.m4b_panel = M4BMetadataPanel()
+        self.m4b_panel.apply_requested.connect(self.apply_panel_tags)
+        file_tags_layout.addWidget(self.m4b_panel)
+        right_layout.addWidget(self.file_tags_group, 1)
+        main_layout.addLayout(right_layout, 2)
 
         self.status_bar = self.statusBar()
         self.status_bar.showMessage("Ready to scan.")
 
+        # Settings menu
+        settings_menu = self.menuBar().addMenu("Settings")
+        scan_workers_action = QAction("Scan Worker Processes...", self)
+        scan_workers_action.triggered.connect(self.edit_scan_workers)
+        settings_menu.addAction(scan_workers_action)
+        series_patterns_action = QAction("Series Patterns...", self)
+        series_patterns_action.triggered.connect(self.edit_series_patterns)
+        settings_menu.addAction(series_patterns_action)
+        self.remote_scan_action = QAction("Network Library Mode", self)
+        self.remote_scan_action.setCheckable(True)
+        self.remote_scan_action.setToolTip("Scan with many parallel requests and large reads, "
+                                           "for libraries on SMB/NFS shares")
+        self.remote_scan_action.setChecked(self.settings.value("remote_scan", False, type=bool))
+        self.remote_scan_action.toggled.connect(lambda on: self.settings.setValue("remote_scan", on))
+        settings_menu.addAction(self.remote_scan_action)
+        rewrite_budget_action = QAction("Rewrite Budget...", self)
+        rewrite_budget_action.triggered.connect(self.edit_rewrite_budget)
+        settings_menu.addAction(rewrite_budget_action)
+        tag_writers_action = QAction("Tag Writer Threads...", self)
+        tag_writers_action.triggered.connect(self.edit_tag_writers)
+        settings_menu.addAction(tag_writers_action)
+        self.timing_log_action = QAction("Write Timing Log", self)
+        self.timing_log_action.setCheckable(True)
+        self.timing_log_action.setChecked(self.settings.value("timing_log", False, type=bool))
+        self.timing_log_action.toggled.connect(lambda on: self.settings.setValue("timing_log", on))
+        settings_menu.addAction(self.timing_log_action)
+        self.watch_action = QAction("Watch Library for Changes", self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.setChecked(self.settings.value("watch_library", False, type=bool))
+        self.watch_action.toggled.connect(self.toggle_watch)
+        settings_menu.addAction(self.watch_action)
+        self.journal_action = QAction("Keep Undo Journal for Tag Jobs", self)
+        self.journal_action.setCheckable(True)
+        self.journal_action.setChecked(self.settings.value("tag_journal", True, type=bool))
+        self.journal_action.toggled.connect(lambda on: self.settings.setValue("tag_journal", on))
+        settings_menu.addAction(self.journal_action)
+        self.covers_action = QAction("Show Cover Thumbnails", self)
+        self.covers_action.setCheckable(True)
+        self.covers_action.setChecked(self.model.show_covers)
+        self.covers_action.toggled.connect(self.toggle_covers)
+        settings_menu.addAction(self.covers_action)
+
+        # Library menu
+        library_menu = self.menuBar().addMenu("Library")
+        self.duplicates_action = QAction("Find Duplicates...", self)
+        self.duplicates_action.triggered.connect(self.find_duplicates)
+        library_menu.addAction(self.duplicates_action)
+        library_menu.addSeparator()
+        self.sidecar_actions = []
+        for text, books in (("Write metadata.json for Selected Books", self.model.selected_books),
+                            ("Write metadata.json for Whole Library", self.all_books)):
+            action = QAction(text, self)
+            action.triggered.connect(lambda _, books=books: self.write_sidecars(books()))
+            library_menu.addAction(action)
+            self.sidecar_actions.append(action)
+
+        # Selection menu
+        selection_menu = self.menuBar().addMenu("Selection")
+        for text, shortcut, slot in (("Select All", "Ctrl+A", self.model.select_all),
+                                     ("Clear Selection", "Ctrl+Shift+A", self.model.clear_selection),
+                                     ("Invert Selection", "Ctrl+I", self.model.invert_selection)):
+            action = QAction(text, self)
+            action.setShortcut(shortcut)
+            action.triggered.connect(slot)
+            selection_menu.addAction(action)
+        selection_menu.addSeparator()
+        self.mismatch_action = QAction("Select Books with Mismatched Tags", self)
+        self.mismatch_action.triggered.connect(self.select_mismatched)
+        selection_menu.addAction(self.mismatch_action)
+
+        # Tags menu
+        tags_menu = self.menuBar().addMenu("Tags")
+        self.deferred_action = QAction("Run Deferred Rewrites", self)
+        self.deferred_action.setEnabled(False)
+        self.deferred_action.triggered.connect(self.run_deferred_rewrites)
+        tags_menu.addAction(self.deferred_action)
+        undo_action = QAction("Undo or Resume Tag Jobs...", self)
+        undo_action.triggered.connect(self.show_journal)
+        tags_menu.addAction(undo_action)
+
+        # Help menu
+        help_menu = self.menuBar().addMenu("Help")
+        diagnostics_action = QAction("Timing Diagnostics...", self)
+        diagnostics_action.triggered.connect(self.show_diagnostics)
+        help_menu.addAction(diagnostics_action)
+
+    def scan_workers(self) -> int:
+        return int(self.settings.value("scan_workers", os.cpu_count() or 1))
+
+    def edit_scan_workers(self):
+        value, ok = QInputDialog.getInt(
+            self, "Scan Worker Processes",
+            "Processes used to parse tags (1 = no parallel parsing):",
+            self.scan_workers(), 1, 64
+        )
+        if ok:
+            self.settings.setValue("scan_workers", value)
+
+    def series_patterns(self) -> tuple:
+        """Extra series patterns (see series.SeriesParser), as cli.py --series-pattern."""
+        return tuple(self.settings.value("series_patterns", [], type=list))
+
+    def edit_series_patterns(self):
+        from PyQt6.QtWidgets import QMessageBox
+        from series import SeriesParser
+
+        text, ok = QInputDialog.getMultiLineText(
+            self, "Series Patterns",
+            "Extra series formats, one regex per line, tried before the built-in ones.\n"
+            "Each needs (?P<name>...) and (?P<index>...) groups. Use the same --series-pattern\n"
+            "options with cli.py so both share the scan index. Applies from the next scan.",
+            "\n".join(self.series_patterns())
+        )
+        if not ok:
+            return
+        patterns = [line.strip() for line in text.splitlines() if line.strip()]
+        try:
+            SeriesParser(patterns)
+        except (re.error, ValueError) as e:
+            QMessageBox.warning(self, "Series Patterns", f"Invalid pattern: {e}")
+            return
+        self.settings.setValue("series_patterns", patterns)
+
+    def rewrite_budget(self) -> Optional[int]:
+        """Bytes full-file rewrites may move per tag job, None for unlimited."""
+        mb = int(self.settings.value("rewrite_budget_mb", -1))
+        return None if mb < 0 else mb * 1024 * 1024
+
+    def edit_rewrite_budget(self):
+        value, ok = QInputDialog.getInt(
+            self, "Rewrite Budget",
+            "MB of audio a tag job may rewrite when new tags do not fit the padding.\n"
+            "Files over budget are deferred (-1 = unlimited, 0 = defer every rewrite):",
+            int(self.settings.value("rewrite_budget_mb", -1)), -1, 10_000_000
+        )
+        if ok:
+            self.settings.setValue("rewrite_budget_mb", value)
+
+    def tag_writers(self) -> int:
+        return int(self.settings.value("tag_writers", 2))
+
+    def edit_tag_writers(self):
+        value, ok = QInputDialog.getInt(
+            self, "Tag Writer Threads",
+            "Files written concurrently (keep low for spinning disks, raise for SSD/NAS):",
+            self.tag_writers(), 1, 32
+        )
+        if ok:
+            self.settings.setValue("tag_writers", value)
+
+    def index_path(self) -> str:
+        # Kept next to the QSettings file
+        return os.path.join(os.path.dirname(self.settings.fileName()), "scan_index.sqlite")
+
+    def journal_path(self) -> str:
+        return os.path.join(os.path.dirname(self.settings.fileName()), "tag_journal.sqlite")
+
+    def timing_log_path(self) -> Optional[str]:
+        """JSON lines file every finished job is appended to, if enabled."""
+        if not self.timing_log_action.isChecked():
+            return None
+        return os.path.join(os.path.dirname(self.settings.fileName()), "timings.jsonl")
+
+    def show_diagnostics(self):
+        from ui.diagnostics_dialog import DiagnosticsDialog
+        DiagnosticsDialog([self.last_scan_metrics, self.last_tag_metrics], self).exec()
+
+    def apply_search(self):
+        matches = self.model.search_index.search(self.search_box.text())
+        self.proxy.set_matches(matches)
+        if matches is None:
+            self.tree.expandToDepth(0)
+            return
+        # Few hits: open their series too
+        if len(matches) <= 100:
+            self.tree.expandAll()
+        else:
+            self.tree.expandToDepth(0)
+        self.status_bar.showMessage(f"{len(matches)} books match.")
+
+    def refresh_search(self):
+        """Re-run an active search after the library changed."""
+        if self.search_box.text().strip():
+            self.search_timer.start()
+
+    def all_books(self) -> List[Audiobook]:
+        return [book for series in self.library_data.values() for group in series.values() for book in group]
+
+    def find_duplicates(self):
+        if not self.library_root or self.scan_worker or self.duplicate_worker:
+            self.status_bar.showMessage("Scan a library first.")
+            return
+        self.duplicates_action.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.duplicate_worker = DuplicateWorker(self.all_books(), self.library_root, self.index_path())
+        self.duplicate_worker.status_update.connect(self.status_bar.showMessage)
+        self.duplicate_worker.progress_update.connect(self.progress_bar.setValue)
+        self.duplicate_worker.duplicates_found.connect(self.on_duplicates_found)
+        self.duplicate_worker.start()
+
+    def on_duplicates_found(self, groups):
+        # The signal can arrive before run() has returned
+        self.duplicate_worker.wait()
+        self.duplicate_worker = None
+        self.duplicates_action.setEnabled(True)
+        self.progress_bar.setVisible(self.tag_worker is not None)
+        if not groups:
+            return
+        from ui.duplicates_dialog import DuplicatesDialog
+        dialog = DuplicatesDialog(groups, self)
+        dialog.select_requested.connect(self.select_books)
+        dialog.exec()
+
+    def select_books(self, books):
+        """Add books to the selection, e.g. to re-tag or review them."""
+        self.model.set_selected(book.path for book in books)
+
+    def select_mismatched(self):
+        """Select every book whose file tags differ from what Apply Tags would write."""
+        if self.mismatch_worker or self.scan_worker or not self.library_data:
+            return
+        self.mismatch_action.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.mismatch_worker = MismatchWorker(self.all_books())
+        self.mismatch_worker.status_update.connect(self.status_bar.showMessage)
+        self.mismatch_worker.progress_update.connect(self.progress_bar.setValue)
+        self.mismatch_worker.mismatches_found.connect(self.on_mismatches_found)
+        self.mismatch_worker.start()
+
+    def on_mismatches_found(self, paths):
+        self.mismatch_worker.wait()
+        self.mismatch_worker = None
+        self.mismatch_action.setEnabled(True)
+        self.progress_bar.setVisible(self.tag_worker is not None)
+        self.model.set_selected(paths)
+
+    def write_sidecars(self, books):
+        """Write Audiobookshelf metadata.json files for the folders of books."""
+        if self.sidecar_worker or self.scan_worker or not books:
+            return
+        folders = len({os.path.dirname(book.path) for book in books})
+        from PyQt6.QtWidgets import QMessageBox
+        confirm = QMessageBox.question(self, "Write metadata.json",
+                                       f"Write metadata.json for {folders} folders from the scanned metadata? "
+                                       "Existing files are updated, keeping chapters and other fields.",
+                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm != QMessageBox.StandardButton.Yes:
+            return
+        for action in self.sidecar_actions:
+            action.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.sidecar_worker = SidecarWorker(books)
+        self.sidecar_worker.status_update.connect(self.status_bar.showMessage)
+        self.sidecar_worker.progress_update.connect(self.progress_bar.setValue)
+        self.sidecar_worker.export_finished.connect(self.on_sidecars_written)
+        self.sidecar_worker.start()
+
+    def on_sidecars_written(self, counts):
+        self.sidecar_worker.wait()
+        self.sidecar_worker = None
+        for action in self.sidecar_actions:
+            action.setEnabled(True)
+        self.progress_bar.setVisible(self.tag_worker is not None)
+        message = (f"metadata.json: {counts['created']} created, {counts['updated']} updated, "
+                   f"{counts['unchanged']} unchanged")
+        if counts["conflict"]:
+            message += f", {counts['conflict']} folders skipped because they hold different books"
+        if counts["failed"]:
+            message += f", {counts['failed']} failed"
+        self.status_bar.showMessage(message + ".")
+
+    def toggle_watch(self, on):
+        self.settings.setValue("watch_library", on)
+        if on and self.library_root and not self.scan_worker:
+            self.start_watcher()
+        elif not on:
+            self.stop_watcher()
+
+    def start_watcher(self):
+        self.stop_watcher()
+        self.watcher = LibraryWatcher(self.library_root, self.all_books(), self, self.series_patterns())
+        self.watcher.status_update.connect(self.status_bar.showMessage)
+        self.watcher.library_changed.connect(self.on_library_changed)
+        self.watcher.start()
+
+    def stop_watcher(self):
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher.deleteLater()
+            self.watcher = None
+
+    def on_library_changed(self, books, removed):
+        """Apply re-parsed and deleted files reported by the watcher."""
+        for path in removed + [book.path for book in books]:
+            old = self.model.book_at(path)
+            if old:
+                LibraryScanner.remove_from_library(self.library_data, old)
+        for book in books:
+            LibraryScanner.add_to_library(self.library_data, book)
+
+        # The selection is keyed by path, so re-parsed books stay selected
+        self.model.remove_books(removed)
+        self.model.update_books(books)
+        self.refresh_search()
+
     def select_folder(self):
         last_dir = self.settings.value("last_dir", "")
         folder = QFileDialog.getExistingDirectory(self, "Select Audiobooks Folder", last_dir)
         if folder:
             self.settings.setValue("last_dir", folder)
+            self.stop_watcher()
+            self.library_root = folder
             self.btn_select.setEnabled(False)
-            self.tree.clear()
-            self.book_item_map = {}
-            self.selected_books.clear()
-            self.selected_count_label.setText("Selected books: 0")
+            self.library_data = {}
+            self.model.clear()
             self.progress_bar.setVisible(True)
-            self.progress_bar.setValue(0)
+            # Total is unknown while discovery streams, so show a busy indicator
+            self.progress_bar.setRange(0, 0)
 
-            self.scan_worker = ScanWorker(folder)
+            self.scan_worker = ScanWorker(folder, self.index_path(), self.scan_workers(),
+                                          self.remote_scan_action.isChecked(), self.series_patterns())
             self.scan_worker.status_update.connect(self.status_bar.showMessage)
-            self.scan_worker.progress_update.connect(self.progress_bar.setValue)
+            self.scan_worker.books_found.connect(self.on_books_found)
             self.scan_worker.scan_finished.connect(self.on_scan_finished)
             self.scan_worker.start()
 
+    def on_books_found(self, books):
+        with self.scan_worker.metrics.phase("populate tree"):
+            self.model.add_books(books)
+        self.refresh_search()
+
     def on_scan_finished(self, data):
         self.library_data = data
-        self.populate_tree()
         self.btn_select.setEnabled(True)
+        self.progress_bar.setRange(0, 100)
         self.progress_bar.setVisible(False)
-        self.status_bar.showMessage(f"Scan Complete. Found {len(self.library_data)} Authors.")
-        self.scan_worker = None
 
-    def populate_tree(self):
-        self.tree.clear()
-        self.book_item_map = {}
-        self.tree.setSortingEnabled(False)
-
-        sorted_authors = sorted(self.library_data.keys())
-        for author in sorted_authors:
-            author_item = QTreeWidgetItem(self.tree)
-            author_item.setText(0, author)
-            author_item.setExpanded(True)
-            author_item.setData(0, Qt.ItemDataRole.UserRole, "AUTHOR")
-
-            font = author_item.font(0)
-            font.setBold(True)
-            font.setPointSize(11)
-            author_item.setFont(0, font)
-
-            series_dict = self.library_data[author]
-            series_keys = sorted(series_dict.keys(), key=lambda x: (x == "Standalone Books", x))
-
-            for series in series_keys:
-                series_item = QTreeWidgetItem(author_item)
-                series_item.setText(0, series)
-                series_item.setData(0, Qt.ItemDataRole.UserRole, "SERIES")
-                series_item.setForeground(0, QBrush(QColor("#88c0d0")))
-
-                books = series_dict[series]
-                books.sort(key=lambda b: (float(b.series_index) if b.series_index else float('inf'), b.title))
-
-                for book in books:
-                    book_item = QTreeWidgetItem(series_item)
-                    book_item.setText(0, book.title)
-                    book_item.setText(1, f"{book.series} #{book.series_index}" if book.series_index else book.series)
-                    book_item.setText(2, str(book.series_index) if book.series_index else "")
-                    book_item.setText(3, book.author or "")
-                    book_item.setText(4, str(book.year) if getattr(book, "year", None) else "")
-                    book_item.setText(5, getattr(book, "narrators", "") or "")
-                    book_item.setText(6, getattr(book, "isbn", "") or "")
-                    book_item.setText(7, getattr(book, "asin", "") or "")
-                    book_item.setText(8, book.filename or "")
-
-                    book_item.setData(0, Qt.ItemDataRole.UserRole, book)
-                    self.book_item_map[book.path] = book_item
+        # Finish again so the wall time includes the batches populated after the worker ended
+        metrics = self.scan_worker.metrics
+        metrics.finish()
+        metrics.append_to_log(self.timing_log_path())
+        self.last_scan_metrics = metrics
+        if self.scan_worker.error is not None:
+            self.status_bar.showMessage(f"Scan stopped by an error: {self.scan_worker.error}. "
+                                        f"Showing the {len(self.library_data)} authors found before it.")
+        else:
+            self.status_bar.showMessage(f"Scan Complete. Found {len(self.library_data)} Authors. "
+                                        f"{metrics.summary()}")
+        self.scan_worker.wait()
+        self.scan_worker = None
+        self.model.search_index.prepare()
+        if self.watch_action.isChecked():
+            self.start_watcher()
 
-        self.tree.setSortingEnabled(True)
+    def on_rows_inserted(self, parent: QModelIndex, first: int, last: int):
+        if not parent.isValid():
+            for row in range(first, last + 1):
+                self.tree.expand(self.proxy.index(row, 0))
 
-    def on_item_click(self, item: QTreeWidgetItem, column: int):
-        data = item.data(0, Qt.ItemDataRole.UserRole)
+    def on_item_click(self, index: QModelIndex):
+        data = index.data(Qt.ItemDataRole.UserRole)
         if isinstance(data, Audiobook):
-            # Toggle selection
-            if item in self.selected_books:
-                self.selected_books.remove(item)
-                font = item.font(0)
-                font.setBold(False)
-                item.setFont(0, font)
+            index = index.siblingAtColumn(0)
+            shift = QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier
+            if shift and self.selection_anchor.isValid():
+                self.model.set_selected(book.path for book in self.visible_books_between(
+                    QModelIndex(self.selection_anchor), index))
             else:
-                self.selected_books.append(item)
-                font = item.font(0)
-                font.setBold(True)
-                item.setFont(0, font)
-            self.selected_count_label.setText(f"Selected books: {len(self.selected_books)}")
-            self.update_preview(data)
+                self.model.toggle_selected(data.path)
+            self.selection_anchor = QPersistentModelIndex(index)
+
+    def on_current_changed(self, current: QModelIndex, previous: QModelIndex):
+        book = current.data(Qt.ItemDataRole.UserRole)
+        if isinstance(book, Audiobook) and book is not self.current_book:
+            self.current_book = book
+            self.update_preview(book)
+            self.show_details(book, self.detail_cache.get(book.path))
+            self.detail_loader.request([book.path] + self.neighbour_paths(current))
+
+    def neighbour_paths(self, index: QModelIndex) -> List[str]:
+        """Paths of the books shown just below and above index, nearest first."""
+        paths = []
+        for step in (self.tree.indexBelow, self.tree.indexAbove):
+            found = 0
+            neighbour = step(index)
+            # Series and author rows in between are passed over, within reason
+            for _ in range(self.PREFETCH_NEIGHBOURS * 4):
+                if not neighbour.isValid() or found == self.PREFETCH_NEIGHBOURS:
+                    break
+                data = neighbour.data(Qt.ItemDataRole.UserRole)
+                if isinstance(data, Audiobook):
+                    paths.append(data.path)
+                    found += 1
+                neighbour = step(neighbour)
+        return paths
+
+    def on_details_loaded(self, details):
+        if self.current_book is not None and details.path == self.current_book.path:
+            self.show_details(self.current_book, details)
+
+    def show_details(self, book, details):
+        """Fill the tag panel and preview cover; details None until they are read."""
+        self.m4b_panel.load_book(book, details)
+        if details is not None and details.thumbnail is not None:
+            self.preview_cover.setPixmap(QPixmap.fromImage(details.thumbnail).scaled(
+                160, 160, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        else:
+            self.preview_cover.clear()
+
+    def toggle_covers(self, on):
+        self.settings.setValue("show_covers", on)
+        self.model.show_covers = on
+        self.tree.viewport().update()
+
+    def visible_books_between(self, first: QModelIndex, last: QModelIndex) -> List[Audiobook]:
+        """Books of the rows shown from first to last (either order), both included."""
+        for start, end in ((first, last), (last, first)):
+            books = []
+            index = start
+            while index.isValid():
+                data = index.data(Qt.ItemDataRole.UserRole)
+                if isinstance(data, Audiobook):
+                    books.append(data)
+                if index == end:
+                    return books
+                index = self.tree.indexBelow(index)
+        return []
 
     def update_preview(self, book: Audiobook):
         self.preview_labels["Title"].setText(book.title or "")
@@ -228,49 +667,65 @@ class MainWindow(QMainWindow):
         self.preview_labels["Filename"].setText(book.filename or "")
 
     def open_context_menu(self, position):
-        item = self.tree.itemAt(position)
-        if not item:
+        index = self.tree.indexAt(position)
+        if not index.isValid():
             return
 
-        data = item.data(0, Qt.ItemDataRole.UserRole)
+        index = index.siblingAtColumn(0)
+        data = index.data(Qt.ItemDataRole.UserRole)
         menu = QMenu()
 
+        # One tag job at a time: two writer pools could save the same file at once
+        idle = self.tag_worker is None and self.rollback_worker is None
         if isinstance(data, Audiobook):
             action = QAction(f"Sync Tags for: {data.title}", self)
-            action.triggered.connect(lambda: self.prepare_tag_sync(item, "BOOK"))
+            action.setEnabled(idle)
+            action.triggered.connect(lambda: self.prepare_tag_sync(index, "BOOK"))
             menu.addAction(action)
         elif data == "SERIES":
-            action = QAction(f"Sync Tags for Series: {item.text(0)}", self)
-            action.triggered.connect(lambda: self.prepare_tag_sync(item, "SERIES"))
+            action = QAction(f"Sync Tags for Series: {index.data()}", self)
+            action.setEnabled(idle)
+            action.triggered.connect(lambda: self.prepare_tag_sync(index, "SERIES"))
             menu.addAction(action)
+            self.add_sidecar_action(menu, index, "Series")
+            self.add_select_actions(menu, index, "Series")
         elif data == "AUTHOR":
-            action = QAction(f"Sync Tags for Author: {item.text(0)}", self)
-            action.triggered.connect(lambda: self.prepare_tag_sync(item, "AUTHOR"))
+            action = QAction(f"Sync Tags for Author: {index.data()}", self)
+            action.setEnabled(idle)
+            action.triggered.connect(lambda: self.prepare_tag_sync(index, "AUTHOR"))
             menu.addAction(action)
+            self.add_sidecar_action(menu, index, "Author")
+            self.add_select_actions(menu, index, "Author")
 
         if not menu.isEmpty():
             menu.exec(self.tree.viewport().mapToGlobal(position))
 
-    def prepare_tag_sync(self, tree_item: QTreeWidgetItem, mode: str):
+    def add_sidecar_action(self, menu, index: QModelIndex, label: str):
+        action = QAction(f"Write metadata.json for {label}", self)
+        action.setEnabled(self.sidecar_worker is None)
+        action.triggered.connect(lambda: self.write_sidecars(
+            [book for book, _ in self.model.books_under(self.proxy.mapToSource(index))]))
+        menu.addAction(action)
+
+    def add_select_actions(self, menu, index: QModelIndex, label: str):
+        menu.addSeparator()
+        for text, selected in ((f"Select All in {label}", True), (f"Deselect All in {label}", False)):
+            action = QAction(text, self)
+            action.triggered.connect(lambda _, selected=selected: self.model.set_selected(
+                (book.path for book, _ in self.model.books_under(self.proxy.mapToSource(index))), selected))
+            menu.addAction(action)
+
+    def prepare_tag_sync(self, index: QModelIndex, mode: str):
+        if self.tag_job_running():
+            return
         books_payload = []
 
-        def collect_books(item: QTreeWidgetItem):
-            for i in range(item.childCount()):
-                child = item.child(i)
-                d = child.data(0, Qt.ItemDataRole.UserRole)
-                if isinstance(d, Audiobook):
-                    if mode == "BOOK":
-                        books_payload.append((d, d.series, d.series_index))
-                    elif mode == "SERIES":
-                        s_name = tree_item.text(0)
-                        books_payload.append((d, s_name, d.series_index))
-                    elif mode == "AUTHOR":
-                        s_name = child.parent().text(0) if child.parent() else d.series
-                        books_payload.append((d, s_name, d.series_index))
-                else:
-                    collect_books(child)
-
-        collect_books(tree_item)
+        # Collect from the model so books in not-yet-loaded series rows are included
+        for book, series_name in self.model.books_under(self.proxy.mapToSource(index)):
+            if mode == "BOOK":
+                books_payload.append((book, book.series, book.series_index))
+            else:
+                books_payload.append((book, series_name, book.series_index))
 
         if not books_payload:
             return
@@ -280,44 +735,173 @@ class MainWindow(QMainWindow):
                                        f"Update tags for {len(books_payload)} files?",
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirm == QMessageBox.StandardButton.Yes:
-            self.run_tag_worker(books_payload)
+            self.run_tag_worker(books_payload, self.rewrite_budget())
 
-    def run_tag_worker(self, payload):
+    def run_tag_worker(self, payload, rewrite_budget=None, resume_job=None):
         self.progress_bar.setVisible(True)
         self.btn_select.setEnabled(False)
-        self.tag_worker = TagWorker(payload)
+        self.btn_apply_tags.setEnabled(False)
+        self.planned_rewrites = (0, 0)
+        self.btn_cancel.setEnabled(True)
+        self.btn_cancel.setVisible(True)
+        journal_path = self.journal_path() if self.journal_action.isChecked() or resume_job else None
+        self.tag_worker = TagWorker(payload, rewrite_budget, self.tag_writers(), journal_path, resume_job)
         self.tag_worker.progress_update.connect(self.progress_bar.setValue)
         self.tag_worker.status_update.connect(self.status_bar.showMessage)
-        self.tag_worker.item_updated.connect(self.on_item_tagged)
+        self.tag_worker.items_updated.connect(self.on_items_tagged)
+        self.tag_worker.rewrites_planned.connect(self.on_rewrites_planned)
+        self.tag_worker.rewrites_deferred.connect(self.on_rewrites_deferred)
         self.tag_worker.finished.connect(self.on_tagging_finished)
         self.tag_worker.start()
 
-    def on_item_tagged(self, book_obj, success):
-        if book_obj.path in self.book_item_map:
-            item = self.book_item_map[book_obj.path]
-            if success:
-                item.setText(2, "TAG UPDATED")
-                item.setForeground(2, QBrush(QColor("#a3be8c")))
-            else:
-                item.setText(2, "FAILED")
-                item.setForeground(2, QBrush(QColor("#bf616a")))
+    def on_items_tagged(self, items):
+        """Show a batch of (book, status) results in one model update."""
+        self.model.set_statuses([(book.path, *self.TAG_STATUSES.get(status, self.TAG_STATUSES["failed"]))
+                                 for book, status in items])
+        # Written files are read again, even if their mtime and size look the same
+        for book, status in items:
+            if status in ("changed", "rolled back"):
+                self.detail_cache.discard(book.path)
+        # The file under the tag panel may have just been rewritten
+        if self.current_book is not None and any(book.path == self.current_book.path for book, _ in items):
+            # Still cached when nothing was written; shown again to re-enable the panel
+            cached = self.detail_cache.get(self.current_book.path)
+            if cached is not None:
+                self.show_details(self.current_book, cached)
+            self.detail_loader.request([self.current_book.path])
+
+    def on_rewrites_planned(self, count, size):
+        self.planned_rewrites = (count, size)
+        if count:
+            self.status_bar.showMessage(f"{count} files need a full rewrite ({size / 1024 / 1024:.1f} MB)")
+
+    def on_rewrites_deferred(self, payload):
+        # Keep a deferred file only once, even if several jobs deferred it
+        pending = {book.path: (book, series, index) for book, series, index in self.deferred_payload}
+        pending.update({book.path: (book, series, index) for book, series, index in payload})
+        self.deferred_payload = list(pending.values())
+        self.deferred_action.setEnabled(True)
+
+    def run_deferred_rewrites(self):
+        if not self.deferred_payload or self.tag_worker:
+            return
+        payload = self.deferred_payload
+        self.deferred_payload = []
+        self.deferred_action.setEnabled(False)
+        self.run_tag_worker(payload)
+
+    def check_interrupted_jobs(self):
+        if not os.path.exists(self.journal_path()):
+            return
+        from journal import TagJournal
+        journal = TagJournal(self.journal_path())
+        try:
+            jobs = journal.interrupted()
+        finally:
+            journal.close()
+        if jobs:
+            self.status_bar.showMessage(f"{len(jobs)} tag job(s) did not finish; resume them under "
+                                        "Tags > Undo or Resume Tag Jobs...")
+
+    def tag_job_running(self) -> bool:
+        """True (and says so) while a tag job or rollback is writing files."""
+        if self.tag_worker or self.rollback_worker:
+            self.status_bar.showMessage("Wait for the running tag job to finish.")
+            return True
+        return False
+
+    def show_journal(self):
+        if self.tag_job_running():
+            return
+        from journal import TagJournal
+        from ui.journal_dialog import JournalDialog
+        journal = TagJournal(self.journal_path())
+        try:
+            dialog = JournalDialog(journal, self)
+            dialog.rollback_requested.connect(self.run_rollback)
+            dialog.resume_requested.connect(lambda job: self.run_tag_worker(None, self.rewrite_budget(), job))
+            dialog.exec()
+        finally:
+            journal.close()
+
+    def run_rollback(self, job, paths, force):
+        self.btn_select.setEnabled(False)
+        self.btn_apply_tags.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.rollback_worker = RollbackWorker(self.journal_path(), job, paths, force)
+        self.rollback_worker.status_update.connect(self.status_bar.showMessage)
+        self.rollback_worker.progress_update.connect(self.progress_bar.setValue)
+        self.rollback_worker.rollback_finished.connect(self.on_rollback_finished)
+        self.rollback_worker.start()
+
+    def on_rollback_finished(self, counts, restored):
+        self.rollback_worker.wait()
+        self.rollback_worker = None
+        self.btn_select.setEnabled(True)
+        self.btn_apply_tags.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.on_items_tagged([(book, "rolled back") for book in map(self.model.book_at, restored) if book])
+        message = f"Rollback complete. {counts['restored']} files restored"
+        if counts["conflict"]:
+            message += f", {counts['conflict']} skipped because their tags changed since"
+        if counts["missing"]:
+            message += f", {counts['missing']} missing"
+        if counts["failed"]:
+            message += f", {counts['failed']} failed"
+        self.status_bar.showMessage(message + ".")
+
+    def cancel_tagging(self):
+        if self.tag_worker:
+            self.tag_worker.cancel()
+            self.btn_cancel.setEnabled(False)
+            self.status_bar.showMessage("Cancelling after the files currently being written...")
 
     def on_tagging_finished(self):
         self.progress_bar.setVisible(False)
+        self.btn_cancel.setVisible(False)
         self.btn_select.setEnabled(True)
-        self.status_bar.showMessage("Tagging complete.")
+        self.btn_apply_tags.setEnabled(True)
+        counts = self.tag_worker.counts
+        rewrites, size = self.planned_rewrites
+        message = (f"Tagging complete. {counts['changed']} updated, "
+                   f"{counts['skipped']} already up to date, {counts['failed']} failed.")
+        if rewrites:
+            message += f" {rewrites} needed a full rewrite ({size / 1024 / 1024:.1f} MB)."
+        if counts["deferred"]:
+            message += f" {counts['deferred']} deferred (Tags > Run Deferred Rewrites)."
+        if counts["cancelled"]:
+            message += f" {counts['cancelled']} cancelled."
+        metrics = self.tag_worker.metrics
+        metrics.append_to_log(self.timing_log_path())
+        self.last_tag_metrics = metrics
+        message += f" {metrics.summary()}"
+        self.status_bar.showMessage(message)
+        self.tag_worker.wait()
         self.tag_worker = None
 
     def apply_bulk_tags(self):
-        if not self.selected_books:
+        if self.tag_job_running():
+            return
+        if not self.model.selected_count():
             from PyQt6.QtWidgets import QMessageBox
             QMessageBox.warning(self, "No Selection", "No books selected to apply tags.")
             return
 
-        books_payload = []
-        for item in self.selected_books:
-            book = item.data(0, Qt.ItemDataRole.UserRole)
-            if isinstance(book, Audiobook):
-                books_payload.append((book, book.series, book.series_index))
+        books_payload = [(book, book.series, book.series_index) for book in self.model.selected_books()]
+
+        self.run_tag_worker(books_payload, self.rewrite_budget())
+
+    def apply_panel_tags(self, payload):
+        """Write the File Tags panel's edits as a one-file tag job."""
+        if self.tag_job_running():
+            book = self.m4b_panel.book
+            self.show_details(book, self.detail_cache.get(book.path))
+            return
+        self.run_tag_worker(payload, self.rewrite_budget())
 
-        self.run_tag_worker(books_payload)
\ No newline at end of file
+    def stop_loaders(self):
+        for loader in (self.detail_loader, self.cover_loader):
+            loader.stop()
+        for loader in (self.detail_loader, self.cover_loader):
+            loader.wait()
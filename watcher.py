@@ -0,0 +1,135 @@
+import os
+from typing import Dict, Set
+
+from PyQt6.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+from workers import RefreshWorker
+
+
+class LibraryWatcher(QObject):
+    """Keeps a scanned library current from filesystem change events.
+
+    Every folder under the root is watched (inotify on Linux), plus each
+    metadata.json so in-place rewrites are noticed. Events are debounced and
+    only the folders they name are re-read, so the cost follows the change,
+    not the library size.
+    """
+
+    DEBOUNCE_MS = 1000
+
+    # (new or re-parsed books, paths of books that are gone)
+    library_changed = pyqtSignal(list, list)
+    status_update = pyqtSignal(str)
+
+    def __init__(self, root, books, parent=None, series_patterns=()):
+        super().__init__(parent)
+        self.root = os.path.abspath(root)
+        self.series_patterns = tuple(series_patterns)
+        # directory -> audio paths the model currently shows for it
+        self.dir_books: Dict[str, Set] = {}
+        for book in books:
+            self.dir_books.setdefault(os.path.dirname(book.path), set()).add(book.path)
+
+        self.watched: Set[str] = set()
+        self.watched_files: Set[str] = set()
+        self.pending: Set[str] = set()
+        self.worker = None
+        self.running = False
+        self.registering = False
+
+        self.fs = QFileSystemWatcher(self)
+        self.fs.directoryChanged.connect(self.queue)
+        self.fs.fileChanged.connect(self.on_file_changed)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DEBOUNCE_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def start(self):
+        """Walk the root once to register every folder, then follow events."""
+        self.running = True
+        self.registering = True
+        self.status_update.emit("Watching library: registering folders...")
+        self.run_worker(RefreshWorker([self.root], self.watched, parse=False))
+
+    def stop(self):
+        self.running = False
+        self.timer.stop()
+        self.pending.clear()
+        if self.watched or self.watched_files:
+            self.fs.removePaths(list(self.watched | self.watched_files))
+        self.watched.clear()
+        self.watched_files.clear()
+        if self.worker:
+            self.worker.wait()
+
+    def queue(self, directory):
+        if not self.running:
+            return
+        self.pending.add(directory)
+        # Restarting the timer coalesces bursts (a downloader copying a book) into one refresh
+        self.timer.start()
+
+    def on_file_changed(self, path):
+        if not os.path.exists(path):
+            # The watch is gone with the file; re-added when the folder is re-read
+            self.watched_files.discard(path)
+        self.queue(os.path.dirname(path))
+
+    def refresh(self):
+        if self.worker or not self.pending:
+            # Picked up again when the running refresh finishes
+            return
+        directories = self.pending
+        self.pending = set()
+        self.run_worker(RefreshWorker(directories, self.watched, series_patterns=self.series_patterns))
+
+    def run_worker(self, worker):
+        self.worker = worker
+        worker.refreshed.connect(self.on_refreshed)
+        worker.start()
+
+    def on_refreshed(self, result):
+        self.worker = None
+        if not self.running:
+            return
+
+        removed = []
+        for directory in result["gone"]:
+            prefix = directory + os.sep
+            for path in [d for d in self.dir_books if d == directory or d.startswith(prefix)]:
+                removed += self.dir_books.pop(path)
+            gone = [d for d in self.watched if d == directory or d.startswith(prefix)]
+            self.watched.difference_update(gone)
+            if gone:
+                self.fs.removePaths(gone)
+
+        for directory, paths in result["present"].items():
+            removed += self.dir_books.pop(directory, set()) - paths
+            if paths:
+                self.dir_books[directory] = paths
+
+        self.add_watches(result["new_dirs"], self.watched)
+        self.add_watches([p for p in result["sidecars"] if p not in self.watched_files], self.watched_files)
+        for directory in result["retry"]:
+            self.queue(directory)
+
+        if result["books"] or removed:
+            self.library_changed.emit(result["books"], removed)
+            self.status_update.emit(f"Library updated: {len(result['books'])} books re-read, "
+                                    f"{len(removed)} removed.")
+        elif self.registering:
+            self.status_update.emit(f"Watching {len(self.watched)} folders for changes.")
+        self.registering = False
+
+        if self.pending:
+            self.timer.start()
+
+    def add_watches(self, paths, watched):
+        if not paths:
+            return
+        failed = set(self.fs.addPaths(paths))
+        watched.update(p for p in paths if p not in failed)
+        if failed:
+            print(f"Could not watch {len(failed)} paths (inotify limit? see fs.inotify.max_user_watches)")
@@ -1,133 +1,475 @@
-from PyQt6.QtCore import QThread, pyqtSignal
-from mutagen.mp4 import MP4, MP4FreeForm
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 import os
-import json
-from pathlib import Path
+import threading
+import time
+import traceback
+from details import BookDetails, file_stamp, tags_cost
+from duplicates import find_duplicates
+from index import ScanIndex
+from journal import TagJournal
+from metrics import JobMetrics
+from mp4meta import read_tags
 from scanner import LibraryScanner
+from sidecars import export_sidecars
+from tagger import TagEditor, TagJob
 
 
 class ScanWorker(QThread):
+    # Parsed books are delivered in batches of this size or age
+    BATCH_SIZE = 200
+    BATCH_INTERVAL = 0.1
+
     status_update = pyqtSignal(str)
-    progress_update = pyqtSignal(int)
+    books_found = pyqtSignal(list)
     scan_finished = pyqtSignal(dict)
+    # JobMetrics of the finished scan
+    metrics_ready = pyqtSignal(object)
 
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, index_path=None, workers=1, remote=False, series_patterns=()):
         super().__init__()
-        self.folder_path = folder_path
+        self.folder_path = os.path.abspath(folder_path)
+        self.index_path = index_path
+        self.workers = max(1, int(workers))
+        # Network-mount mode, see LibraryScanner.scan
+        self.remote = remote
+        self.series_patterns = tuple(series_patterns)
+        self.metrics = JobMetrics("scan")
+        # Exception that ended the scan early, if any
+        self.error = None
 
     def run(self):
         self.status_update.emit("Scanning folders...")
-        library = {}
+        self.library = {}
+        self.batch = []
+        self.last_flush = time.monotonic()
+        self.found = 0
+
+        stats = {"total": 0, "reused": 0}
+        try:
+            for books in LibraryScanner.scan(self.folder_path, self.index_path, self.workers, stats, self.metrics,
+                                             self.series_patterns, self.remote):
+                with self.metrics.phase("grouping"):
+                    for book in books:
+                        self.add_book(book)
+                self.flush()
+        except Exception as e:
+            traceback.print_exc()
+            self.error = e
+        finally:
+            # Always finish, so the window leaves its scanning state; books found so far are kept
+            self.flush(force=True)
+            self.metrics.finish()
+            if self.error is None:
+                self.status_update.emit(f"Processing complete. {stats['reused']} of {stats['total']} "
+                                        f"files unchanged.")
+            else:
+                self.status_update.emit(f"Scan stopped by an error after {stats['total']} files: {self.error}")
+            self.metrics_ready.emit(self.metrics)
+            self.scan_finished.emit(self.library)
+
+    def add_book(self, book):
+        LibraryScanner.add_to_library(self.library, book)
+        self.batch.append(book)
+        if len(self.batch) >= self.BATCH_SIZE:
+            self.flush(force=True)
+
+    def flush(self, force=False):
+        """Emit buffered books once the batch is full or old enough."""
+        if not self.batch:
+            return
+        if not force and time.monotonic() - self.last_flush < self.BATCH_INTERVAL:
+            return
+        self.found += len(self.batch)
+        self.books_found.emit(self.batch)
+        self.batch = []
+        self.last_flush = time.monotonic()
+        self.status_update.emit(f"Scanning folders... {self.found} books found")
+
+
+class RefreshWorker(QThread):
+    """Re-reads a few directories reported by the library watcher.
+
+    Only the given directories (and subtrees that were not watched yet) are
+    listed and parsed. The result is a dict with:
+      books     re-parsed books of every listed directory
+      present   directory -> set of audio paths now in it
+      gone      directories that no longer exist
+      new_dirs  directories that need a watch
+      sidecars  sidecar files that need a watch
+      retry     directories with files still being written
+    """
+    # Files modified more recently than this are assumed to be still copying
+    SETTLE_SECONDS = 2.0
+
+    refreshed = pyqtSignal(dict)
+
+    def __init__(self, directories, watched, parse=True, series_patterns=()):
+        super().__init__()
+        self.directories = sorted(directories)
+        # Read only while the worker runs; the watcher changes it after `refreshed`
+        self.watched = watched
+        self.parse = parse
+        # Same patterns as the scan, so re-read books keep their series/index
+        self.series_patterns = tuple(series_patterns)
 
-        all_files = []
-        for root, dirs, files in os.walk(self.folder_path):
-            for file in files:
-                if file.lower().endswith((".m4b", ".m4a")):
-                    all_files.append(os.path.join(root, file))
+    def run(self):
+        result = {"books": [], "present": {}, "gone": [], "new_dirs": [], "sidecars": [], "retry": []}
+        now = time.time()
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                result["gone"].append(directory)
+                continue
+            # Watched subdirectories report their own changes, so only new ones are entered
+            for path, audio, sidecars in LibraryScanner.iter_directories(
+                    directory, all_dirs=True, prune=self.watched.__contains__):
+                if path not in self.watched:
+                    result["new_dirs"].append(path)
+                result["sidecars"] += [os.path.join(path, name) for name in sidecars]
+                if self.parse:
+                    self.read_directory(path, audio, sidecars, now, result)
+        self.refreshed.emit(result)
 
-        total_files = len(all_files)
-        processed = 0
+    def read_directory(self, directory, audio, sidecars, now, result):
+        for name in audio + sidecars:
+            try:
+                if now - os.stat(os.path.join(directory, name)).st_mtime < self.SETTLE_SECONDS:
+                    result["retry"].append(directory)
+                    return
+            except OSError:
+                pass
+        books = LibraryScanner.parse_directory(directory, audio, sidecars, self.series_patterns)
+        result["books"] += [book for book in books if book]
+        result["present"][directory] = {os.path.join(directory, name) for name in audio}
 
-        for file_path in all_files:
-            processed += 1
-            progress_pct = int((processed / total_files) * 100)
-            self.progress_update.emit(progress_pct)
 
-            path_obj = Path(file_path)
+class DuplicateWorker(QThread):
+    """Looks for duplicate books, using the scan index for audio sizes and durations."""
+    status_update = pyqtSignal(str)
+    progress_update = pyqtSignal(int)
+    # List of DuplicateGroup
+    duplicates_found = pyqtSignal(list)
 
-            # Load JSON metadata if present
-            json_data = None
-            parent_dir = os.path.dirname(file_path)
-            for j_name in ["metadata.json", "abs_metadata.json"]:
-                j_path = os.path.join(parent_dir, j_name)
-                if os.path.exists(j_path):
-                    try:
-                        with open(j_path, 'r', encoding='utf-8') as f:
-                            json_data = json.load(f)
-                        break
-                    except:
-                        pass
+    def __init__(self, books, root, index_path=None):
+        super().__init__()
+        self.books = books
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
 
-            book = LibraryScanner.parse_book(path_obj, json_data)
+    def run(self):
+        self.status_update.emit("Looking for duplicates...")
+        audio_info = {}
+        if self.index_path and os.path.exists(self.index_path):
+            index = ScanIndex(self.index_path)
+            try:
+                audio_info = index.audio_info(self.root)
+            finally:
+                index.close()
 
-            if book:
-                author_key = book.author
-                if author_key not in library:
-                    library[author_key] = {}
+        percent = [0]
 
-                series_key = book.series if book.series else "Standalone Books"
-                if series_key not in library[author_key]:
-                    library[author_key][series_key] = []
+        def on_progress(done, total):
+            # Only whole-percent steps reach the GUI thread
+            if int(done * 100 / total) != percent[0]:
+                percent[0] = int(done * 100 / total)
+                self.progress_update.emit(percent[0])
 
-                library[author_key][series_key].append(book)
+        groups = find_duplicates(self.books, audio_info, on_progress=on_progress)
+        self.status_update.emit(f"Found {len(groups)} groups of possible duplicates.")
+        self.duplicates_found.emit(groups)
 
-        self.status_update.emit("Processing complete.")
-        self.scan_finished.emit(library)
+
+class MismatchWorker(QThread):
+    """Finds books whose file tags differ from what Apply Tags would write."""
+    # Tag reads are small and I/O bound
+    THREADS = 8
+
+    status_update = pyqtSignal(str)
+    progress_update = pyqtSignal(int)
+    # Paths of the books that would change
+    mismatches_found = pyqtSignal(list)
+
+    def __init__(self, books):
+        super().__init__()
+        self.books = books
+
+    def check(self, book):
+        try:
+            return bool(TagEditor.plan(book, book.series, book.series_index).changes)
+        except Exception as e:
+            print(f"Failed to read {book.filename}: {e}")
+            return False
+
+    def run(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.status_update.emit(f"Comparing tags of {len(self.books)} books...")
+        mismatched = []
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            for i, (book, changed) in enumerate(zip(self.books, pool.map(self.check, self.books)), 1):
+                if changed:
+                    mismatched.append(book.path)
+                if i % 100 == 0:
+                    self.progress_update.emit(int(i * 100 / len(self.books)))
+        self.status_update.emit(f"{len(mismatched)} of {len(self.books)} books have tags that differ.")
+        self.mismatches_found.emit(mismatched)
+
+
+class SidecarWorker(QThread):
+    """Writes metadata.json sidecars for a set of books."""
+    status_update = pyqtSignal(str)
+    progress_update = pyqtSignal(int)
+    # Directory counts per status (see sidecars.STATUSES)
+    export_finished = pyqtSignal(dict)
+
+    def __init__(self, books):
+        super().__init__()
+        self.books = books
+
+    def run(self):
+        total = len({os.path.dirname(book.path) for book in self.books})
+        self.status_update.emit(f"Writing metadata.json for {total} folders...")
+        done = [0]
+        percent = [0]
+
+        def on_item(directory, status):
+            done[0] += 1
+            if int(done[0] * 100 / total) != percent[0]:
+                percent[0] = int(done[0] * 100 / total)
+                self.progress_update.emit(percent[0])
+
+        counts = export_sidecars(self.books, on_item=on_item)
+        self.export_finished.emit(counts)
 
 
 class TagWorker(QThread):
+    """Runs a TagJob, publishing its progress to the GUI at a fixed rate.
+
+    The job thread only records the latest status/progress and item results
+    under a lock; a timer in the GUI thread emits them every
+    UPDATE_MS, so per-file signals never queue up behind each other.
+    """
+    UPDATE_MS = 100
+
     status_update = pyqtSignal(str)
     progress_update = pyqtSignal(int)
-    item_updated = pyqtSignal(object, bool)
+    # [(book, "changed" | "skipped" | "failed" | "deferred" | "cancelled"), ...]
+    items_updated = pyqtSignal(list)
+    # (files needing a full rewrite, bytes those rewrites move), before anything is written
+    rewrites_planned = pyqtSignal(int, int)
+    # Payload entries held back because they exceeded the rewrite budget
+    rewrites_deferred = pyqtSignal(list)
     finished = pyqtSignal()
 
-    def __init__(self, payload):
+    def __init__(self, payload, rewrite_budget=None, writers=1, journal_path=None, resume_job=None):
+        """With resume_job, the payload comes from the journal and finished files are skipped."""
         super().__init__()
+        self.journal = TagJournal(journal_path) if journal_path else None
+        done = ()
+        if resume_job is not None:
+            payload, done = self.journal.resume(resume_job)
         self.payload = payload
+        self.job = TagJob(payload, rewrite_budget, writers, journal=self.journal, journal_id=resume_job, done=done)
+        self.job.on_status = self.set_status
+        self.job.on_progress = self.set_progress
+        self.job.on_item = self.add_item
+        self.job.on_rewrites_planned = self.rewrites_planned.emit
+        self.counts = self.job.counts
+        self.metrics = self.job.metrics
+
+        self.lock = threading.Lock()
+        self.pending_items = []
+        self.pending_status = None
+        self.pending_progress = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.UPDATE_MS)
+        self.timer.timeout.connect(self.publish)
+        self.started.connect(self.timer.start)
+        # Connected first, so the last updates arrive before anyone handles `finished`
+        self.finished.connect(self.stop_updates)
+
+    # Called on the job thread
+
+    def set_status(self, message):
+        with self.lock:
+            self.pending_status = message
+
+    def set_progress(self, percent):
+        with self.lock:
+            self.pending_progress = percent
+
+    def add_item(self, book, status):
+        with self.lock:
+            self.pending_items.append((book, status))
+
+    # Called on the GUI thread
+
+    def publish(self):
+        with self.lock:
+            items, self.pending_items = self.pending_items, []
+            status, self.pending_status = self.pending_status, None
+            progress, self.pending_progress = self.pending_progress, None
+        if items:
+            self.items_updated.emit(items)
+        if progress is not None:
+            self.progress_update.emit(progress)
+        if status is not None:
+            self.status_update.emit(status)
+
+    def stop_updates(self):
+        self.timer.stop()
+        self.publish()
+
+    def cancel(self):
+        """Stop after the files currently being written; the rest is reported as cancelled."""
+        self.job.cancel()
 
     def run(self):
-        total = len(self.payload)
-        for i, (book, series, index) in enumerate(self.payload):
-            self.status_update.emit(f"Applying ABS metadata: {book.filename}")
-            self.progress_update.emit(int((i / total) * 100))
+        try:
+            deferred = self.job.run()
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+        if deferred:
+            self.rewrites_deferred.emit(deferred)
+        self.finished.emit()
 
-            try:
-                audio = MP4(book.path)
-
-                # Helper to wrap normal text fields as list of strings
-                def list_str(val):
-                    return [str(val)] if val is not None else [""]
-
-                # Apply standard tags from ABS metadata
-                audio.tags["\xa9nam"] = list_str(book.title)
-                audio.tags["\xa9ART"] = list_str(book.author)
-                audio.tags["aART"] = list_str(book.author)
-
-                if series and series != "Standalone Books":
-                    audio.tags["\xa9grp"] = list_str(series)
-                    audio.tags["\xa9alb"] = list_str(series)
-                else:
-                    if "\xa9grp" in audio.tags:
-                        del audio.tags["\xa9grp"]
-                    if "\xa9alb" in audio.tags:
-                        del audio.tags["\xa9alb"]
-
-                # Series index / disk
-                if index:
-                    try:
-                        idx_int = int(float(index))
-                        audio.tags["disk"] = [(idx_int, 0)]
-                    except ValueError:
-                        pass
-
-                # Optional ABS metadata fields
-                if getattr(book, "narrators", None):
-                    audio.tags["----:com.apple.iTunes:Narrators"] = [MP4FreeForm(book.narrators.encode("utf-8"))]
-                if getattr(book, "year", None):
-                    audio.tags["\xa9day"] = list_str(book.year)
-                if getattr(book, "isbn", None):
-                    audio.tags["----:com.apple.iTunes:ISBN"] = [MP4FreeForm(book.isbn.encode("utf-8"))]
-                if getattr(book, "asin", None):
-                    audio.tags["----:com.apple.iTunes:ASIN"] = [MP4FreeForm(book.asin.encode("utf-8"))]
-                if getattr(book, "description", None):
-                    audio.tags["\xa9cmt"] = list_str(book.description)
-
-                audio.save()
-                self.item_updated.emit(book, True)
-
-            except Exception as e:
-                print(f"Failed to update {book.filename}: {e}")
-                self.item_updated.emit(book, False)
-
-        self.progress_update.emit(100)
-        self.finished.emit()
\ No newline at end of file
+
+class RollbackWorker(QThread):
+    """Restores the original tags of a journaled tag job (or some of its files)."""
+    status_update = pyqtSignal(str)
+    progress_update = pyqtSignal(int)
+    # (counts per status, paths restored)
+    rollback_finished = pyqtSignal(dict, list)
+
+    def __init__(self, journal_path, job, paths=None, force=False):
+        super().__init__()
+        self.journal_path = journal_path
+        self.job = job
+        self.paths = paths
+        self.force = force
+
+    def run(self):
+        journal = TagJournal(self.journal_path)
+        try:
+            total = len(self.paths) if self.paths is not None else len(journal.entries(self.job))
+            restored = []
+            done = [0]
+            percent = [0]
+
+            def on_item(path, status):
+                if status == "restored":
+                    restored.append(path)
+                done[0] += 1
+                if total and int(done[0] * 100 / total) != percent[0]:
+                    percent[0] = int(done[0] * 100 / total)
+                    self.progress_update.emit(percent[0])
+
+            self.status_update.emit(f"Rolling back tag job {self.job}...")
+            counts = journal.rollback(self.job, self.paths, self.force, on_item)
+        finally:
+            journal.close()
+        self.rollback_finished.emit(counts, restored)
+
+
+class DetailLoader(QThread):
+    """Reads full tag sets and cover thumbnails for the detail panels.
+
+    Runs until stop(). request() replaces whatever is still queued: the
+    current book first, then its neighbours as prefetch. Files whose cached
+    details still match their mtime and size are not read again. Covers come
+    from the thumbnail cache (covers.CoverCache).
+    """
+    # BookDetails, also stored in the cache
+    details_loaded = pyqtSignal(object)
+
+    def __init__(self, cache, covers):
+        super().__init__()
+        self.cache = cache
+        self.covers = covers
+        self.pending = []
+        self.stopping = False
+        self.condition = threading.Condition()
+
+    def request(self, paths):
+        with self.condition:
+            self.pending = list(paths)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.pending = []
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                path = self.pending.pop(0)
+            stamp = file_stamp(path)
+            if stamp is None or self.cache.fresh(path, stamp):
+                continue
+            details = self.load(path, stamp)
+            self.cache.put(details)
+            self.details_loaded.emit(details)
+
+    def load(self, path, stamp) -> BookDetails:
+        try:
+            tags = read_tags(path)
+        except Exception as e:
+            return BookDetails(path, stamp, {}, error=str(e))
+        # QImage (unlike QPixmap) may be used off the GUI thread
+        thumbnail = self.covers.load(path)
+        cost = tags_cost(tags) + (thumbnail.sizeInBytes() if thumbnail is not None else 0)
+        return BookDetails(path, stamp, tags, thumbnail, cost)
+
+
+class CoverLoader(QThread):
+    """Loads cover icons for the library tree, most recently requested first.
+
+    Requests come from rows being painted, so the newest ones are the rows
+    on screen; rows scrolled past are still loaded afterwards, which fills
+    the thumbnail cache for next time.
+    """
+    # (path, QImage of at most icon_size, or None without cover)
+    cover_loaded = pyqtSignal(str, object)
+
+    def __init__(self, covers, icon_size):
+        super().__init__()
+        self.covers = covers
+        self.icon_size = icon_size
+        self.pending = []
+        self.queued = set()
+        self.stopping = False
+        self.condition = threading.Condition()
+
+    def request(self, path):
+        with self.condition:
+            if path not in self.queued:
+                self.queued.add(path)
+                self.pending.append(path)
+                self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+    def run(self):
+        self.covers.prune()
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                path = self.pending.pop()
+                self.queued.discard(path)
+            image = self.covers.load(path)
+            if image is not None:
+                image = image.scaled(self.icon_size, self.icon_size, Qt.AspectRatioMode.KeepAspectRatio,
+                                     Qt.TransformationMode.SmoothTransformation)
+            self.cover_loaded.emit(path, image)